@@ -23,13 +23,18 @@ __license__ = "Simplified BSD 2-Clause License"
 #   - Stop
 #   - LEDs
 #   - Start print button
-#   - bounce delay on multi control
 #   - Pause status / not connected error
 #
 # Use own functions for all get and post
 # Make debugging output (Debug in config)
 
+# Startup is timed from here to the first frame
+import time
+launchTime = time.time()
+
 import os
+import math
+import collections
 import getpass
 import numpy
 #import sys
@@ -39,40 +44,67 @@ import pygame
 import requests
 import json
 #import platform
-import time
 #import subprocess
 #from pygame.locals import *
 #from collections import deque
-from ConfigParser import RawConfigParser
+from octoConfig import loadConfig, configError, configWatcher, restartSettings
+from buttonModel import button, visibilityTable, SOFT, HARD, TOGGLE
 from miniScButton import miniScButton
+from statusPoller import statusPoller
+from printerState import printerState, octoStatus, pollStatus, failed, connectMode, connectLabels
+from printerState import STARTING, READY, ERROR, OFFLINE, NO_PRINTER, PRINTING, PAUSED, PAUSING, LOADED, CONNECTED
+from printerState import NO_ACTION, CONNECT, PAUSE, RESUME, PRINT, FILEMAN
+from octoClient import octoClient, circuitOpen
+from circuitBreaker import circuitBreaker
+from octoPush import octoPush, pushStatus
+import textCache
+from textCache import renderText
 from socket import error as SocketError
 import errno
-import RPi.GPIO as GPIO
+from gpioInput import gpioInput
+from piezo import piezo
+from fileList import fileTree
+from saverContent import saverContent
+from listView import listView
+from hitIndex import hitIndex
+from commandQueue import commandQueue, FULL
+from responseCache import responseCache
+from screenSaver import screenSaver
+from dashboard import dashboard
+try:
+	import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):
+	# Not on a Pi, use a stand in so the screen can still be run and tested
+	print "RPi.GPIO not available, GPIO buttons will not work"
+	from gpioInput import fakeGPIO
+	GPIO = fakeGPIO()
 GPIO.setmode(GPIO.BOARD)
 
-# Button data structure
-#  format="soft"	       A soft 'on screen' button
-#  type - static | toggle      Toggle text changes
-#  label                       The current label display, or constant for static
-#  toggleOpts                  The list of possible toggle options
-#  currentState                Which state is it currently in (for toggles)?
-#  command		       Command to execute
-#  toggleCmds		       The list of possible toggle commands
-#  buttonObj		       The button object - miniScButton
-#  visible		       Visibility property a(always),p(not when printing),o(not when no octoprint)
-
-# GPIO button data structure
-#  format="hard"	       A hardware button
-#  label		       Only used for debugging
-#  type - static | toggle      Toggle text changes
-#  command		       Command to execute
-#  pin			       GPIO pin, only used for GPIO buttons
-
 # Init fonts
 pygame.font.init()
 statusFont = pygame.font.Font('freesansbold.ttf',14)
 saverFont = pygame.font.Font('freesansbold.ttf',24)
 
+# Custom event posted when a GPIO button is pressed
+GPIOEVENT = pygame.USEREVENT+1
+# Custom event posted when the status poller has a new status
+STATUSEVENT = pygame.USEREVENT+2
+# Custom event posted when the screen saver content changes
+SAVEREVENT = pygame.USEREVENT+3
+# Custom event posted when the config file has changed
+CONFIGEVENT = pygame.USEREVENT+4
+# Custom event posted when commands are queued, finish or fail
+COMMANDEVENT = pygame.USEREVENT+5
+# Custom event posted when a file manager folder has been downloaded
+FILESEVENT = pygame.USEREVENT+6
+# Timer event which ends the main loop's wait when the next deadline is due.
+# The last user event SDL 1.2 has room for
+WAKEEVENT = pygame.USEREVENT+7
+
+def responseOK(r):
+	# Did a request get a successful response?
+	return r is not None and r.status_code<400
+
 class OctoMiniScreen():
 	# Main OctoMiniScreen Class
 	pathName=os.path.dirname(__file__)
@@ -84,82 +116,46 @@ class OctoMiniScreen():
 	# Avoids text running into the button
 	printTextWidth = 14
 
-	# Read the config file
-	cfg = RawConfigParser()
-	cfg.readfp(open(configFile, "r"))
-
-	OctoURL = cfg.get('settings', 'octourl')
-	APIkey = cfg.get('settings', 'apikey')
-	Width = cfg.getint('settings', 'width')
-	Height = cfg.getint('settings', 'height')
-	Pointer = cfg.get('settings', 'show_pointer')
-	BPR = cfg.getint('settings', 'buttons_per_row')
-	screenSave = cfg.getint('settings', 'screen_save')*1000
-	screenFile = cfg.get('settings', 'screen_save_cont')
-	statRefresh = cfg.getint('settings', 'status_refresh')
-	Piezo = cfg.get('settings', 'piezo')
-	if(Piezo=="yes"):
-		Piezo_pin=cfg.getint('settings', 'piezo_pin')
-		Piezo_duration=cfg.getfloat('settings', 'piezo_duration')
-
-	click_delay = cfg.getint('settings', 'click_delay')
+	# Status bar text and colour for each printer state, {0} is the progress
+	statusTexts = {READY: ("Running...", (0,200,0)),
+		ERROR: ("Error connecting to Octoprint", (200,130,0)),
+		OFFLINE: ("Error: Octoprint not running", (200,0,0)),
+		NO_PRINTER: ("Printer not connected", (200,130,0)),
+		PRINTING: ("Printing: {0}", (0,200,0)),
+		PAUSED: ("Paused: {0}", (0,200,0)),
+		PAUSING: ("Pausing......", (0,200,0)),
+		LOADED: ("Ready: {0}", (0,200,0))}
 
 	butBorder = (160,215,0)
 	butText = (100,200,200)
 	butHighlight = (40, 80, 160)
 	background = (0,0,64)
 
-	# Screen saver text starting position
-	screenSavePos = [10,10]
-	screenSaveLimit = [Width*0.75,Height*0.75]
-	# How many seconds to wait before next moving
-	screenSaveSpeed = 0.1
-	# Direction of screen saver text
-	screenSaveDirection = 0
 	# Colours
 	fileColour=(220,60,0)
 	progColour=(60,220,100)
+	dashColour=(230,230,230)
 	fileListColour=(60,200,60)
 
-	# Time of next screen saver movement
-	nextSSaveMove=0
-	# Time of permitted next click - used to avoid accidents
+	# Time of permitted next click - used to avoid accidents. Each button
+	# keeps its own, these are for the connect button and file list
+	nextConnectClick=0
 	nextClick=0
 
 
 	statusSize=40	# How much space to dedicate to a status bar
 
-	# URLs to use
-	urls = {'base': OctoURL,
-		'version': OctoURL + '/api/version',
-		'connection': OctoURL + '/api/connection',
-		'printer': OctoURL + '/api/printer',
-		'command': OctoURL + '/api/printer/command',
-		'job': OctoURL + '/api/job',
-		'filelist': OctoURL + '/api/files?recursive=true',
-		'delete': OctoURL + '/api/files/local/',
-		'select': OctoURL + '/api/files/local/'
-		}
-	APIheader = {'X-Api-Key': APIkey, 'content-type': 'application/json'}
-
-	# Is Octopi running. 0=Yes OK, 1=yes but error, 2=Critical - not running
-	# 3=connected no printer, 4=printing
-	# Start with -1 to force a state change on startup
-	octoPstate = -1
 	vQuit = False
 
-	# Report printer progress - note this is a string
-	vProgress = "0"
-	vProgMini = "0"
-
-	# Show the connection button? 0=no, 1=connect, 2=pause, 3=resume
-	vShowConnect = 1
-
-	# File manager list global
-	filemanList = []
-	# Other file management globals
-	fileStart = 0			# Which index to display first, used for scrolling
-	totalFiles = 12			# Total which can be displayed on screen at a time
+	# File management globals
+	totalFiles = 11			# Total which can be displayed on screen at a time
+	fileRowHeight = 18		# Height of each file in the list
+	fileBarHeight = 26		# Height of the sort and letter bar below the list
+	# Sort orders, and the labels the sort button cycles through
+	fileSorts = [('date', "Date"), ('name', "Name"), ('size', "Size"), ('time', "Time"), ('last', "Last")]
+	# Letter groups to filter the list by
+	fileGroups = [("All", None), ("A-D", "ABCD"), ("E-H", "EFGH"), ("I-L", "IJKL"),
+		("M-P", "MNOP"), ("Q-T", "QRST"), ("U-Z", "UVWXYZ"), ("#", "#")]
 	fileNameLength = 32		# Number of characters to limit length to
 	fileIconList = []
 
@@ -187,69 +183,37 @@ class OctoMiniScreen():
 
 	# End of fileManIcon class
 
-	# Process the buttons
-	sections=cfg.sections()
-	Buttons = []
-	GPIObuttons = []
-	for s in sections:
-		#print "Section found: " + s
-		if (s.find('button')>-1):
-			items = cfg.items(s)
-			vType = ""
-			newButton = {}
-			newButton['format']="soft"
-			for i in items:
-				#print "    Item: " + i[0] + "=" + i[1]
-				if(i[0]=="type"):
-					vType=i[1]
-					newButton['type']=i[1]
-				elif(i[0]=="label"):
-					if(newButton['type']=="static"):
-						newButton['label']=i[1]
-					elif(newButton['type']=="toggle"):
-						newButton['toggleOpts']=i[1].split('|')
-						newButton['label']=newButton['toggleOpts'][0]
-						newButton['currentState']=0
-				elif(i[0]=="command"):
-					cmdIn=i[1].replace('\n','');
-					print("Found command", cmdIn);
-					if(newButton['type']=="static"):
-						newButton['command']=cmdIn
-					elif(newButton['type']=="toggle"):
-						newButton['toggleCmds']=cmdIn.split('|')
-						newButton['command']=newButton['toggleCmds'][0]
-				elif(i[0]=="visible"):
-					newButton['visible']=i[1]
-			# End of processing items
-			Buttons.append(newButton)
-		if (s.find('gpio')>-1):
-			items = cfg.items(s)
-			vType = ""
-			newButton = {}
-			newButton['format']="hard"
-			for i in items:
-				if(i[0]=="type"):
-					vType=i[1]
-					newButton['type']=i[1]
-				elif(i[0]=="command"):
-					if(newButton['type']=="static"):
-						newButton['command']=i[1]
-					elif(newButton['type']=="toggle"):
-						newButton['toggleCmds']=i[1].split('|')
-						newButton['command']=newButton['toggleCmds'][0]
-						newButton['currentState']=0
-				elif(i[0]=="pin"):
-					newButton['pin']=int(i[1])
-					newButton['label']="GPIO_PIN"+i[1]
-			# End of processing items
-			GPIObuttons.append(newButton)
-	# End of sections for loop, buttons processed
-
-
-
-	def __init__(self, caption="OctoMiniScreen"):
-		# *** Learn about __init__ and remove this comment!
+	def __init__(self, config, caption="OctoMiniScreen"):
+		# config is the screenConfig read by octoConfig.loadConfig
 		print "Init OctoMiniScreen"
+		self.config = config
+		self.settings = config.settings
+		self.configError = None		# Why the edited config file was not used
+
+		# URLs to use
+		OctoURL = self.settings.OctoURL
+		self.urls = {'base': OctoURL,
+			'version': OctoURL + '/api/version',
+			'connection': OctoURL + '/api/connection',
+			'printer': OctoURL + '/api/printer',
+			'command': OctoURL + '/api/printer/command',
+			'job': OctoURL + '/api/job',
+			'filelist': OctoURL + '/api/files/local',
+			'delete': OctoURL + '/api/files/local/',
+			'select': OctoURL + '/api/files/local/',
+			'login': OctoURL + '/api/login',
+			'push': 'ws' + OctoURL[4:] + '/sockjs/websocket'
+			}
+		self.APIheader = {'X-Api-Key': self.settings.APIkey, 'content-type': 'application/json'}
+
+		# Memory limit for rendered text
+		if(self.settings.textCacheKB is not None):
+			textCache.cache.maxBytes = self.settings.textCacheKB*1024
+
+		# Buttons, with what changes as they are used
+		self.Buttons = self.makeButtons(config.buttons, SOFT)
+		self.GPIObuttons = self.makeButtons(config.gpioButtons, HARD)
+		self.gpioByPin = dict((b.pin, b) for b in self.GPIObuttons)
 
 		# **** Calculate button geometry
 
@@ -260,321 +224,687 @@ class OctoMiniScreen():
 			os.putenv('SDL_FBDEV'      , '/dev/fb1')
 			os.putenv('SDL_MOUSEDRV', 'TSLIB')
 			os.putenv('SDL_MOUSEDEV', '/dev/input/touchscreen')
-		else:
-			# Always show the pointer if not root
-			self.Pointer="yes"
+		# Always show the pointer if not root
+		showPointer = self.settings.Pointer or getpass.getuser()!="root"
 
 		# Start pygame and set up screen
 		pygame.init()
 
 		# Should we show mouse pointer?
-		if(self.Pointer=="yes"):
+		if(showPointer):
 			pygame.mouse.set_visible(True)
 		else:
 			pygame.mouse.set_visible(False)
 
 		# Open window and start
-		self.screen = pygame.display.set_mode( (self.Width, self.Height) )
+		self.screen = pygame.display.set_mode( (self.settings.Width, self.settings.Height) )
 
 		# Load any icons
 		self.upArrowImg = pygame.image.load(self.pathName+"/icons/up_arrow.jpg").convert()
 		self.downArrowImg = pygame.image.load(self.pathName+"/icons/down_arrow.jpg").convert()
 		self.deleteImg = pygame.image.load(self.pathName+"/icons/delete.png").convert()
 
-		# Init buttons
-		# Calculate size
-		Padding=6
-		bWidth=int((self.Width-(Padding*self.BPR))/self.BPR)-1
-		bRows=-(-len(self.Buttons)//self.BPR)
-		print "Length={0}, Buttons per row={1}, required rows = {2}".format(len(self.Buttons),self.BPR,bRows)
-		bHeight=int((self.Height-self.statusSize-(Padding*bRows))/bRows)
-
-		# Define the buttons
-		vRow=0
-		vCol=0
-		for b in self.Buttons:
-			print "Defining button " + b['label']
-			newButton=miniScButton(((bWidth+Padding)*vCol)+Padding, ((bHeight+Padding)*vRow)+Padding, bWidth, bHeight, b['label'], self.butBorder, self.butText, self.butHighlight, 1)
-			b['buttonObj']=newButton
-			vCol=vCol+1
-			if(vCol==self.BPR):
-				vCol=0
-				vRow=vRow+1
-
 		# Set up the connect button, though we might not draw it
-		self.connectButton = miniScButton(self.Width-85, self.Height-self.statusSize+4, 80, self.statusSize-8, "Connect", self.butBorder, self.butText, self.butHighlight, 1)
+		self.connectButton = miniScButton(self.settings.Width-85, self.settings.Height-self.statusSize+4, 80, self.statusSize-8, "Connect", self.butBorder, self.butText, self.butHighlight, 1)
+		# Tapping the rest of the status bar shows the print details
+		self.statusArea = pygame.Rect(0, self.settings.Height-self.statusSize, self.settings.Width-90, self.statusSize)
 
-		# Set up GPIO buttons
+		# Init buttons, and the index of where they are for finding touches
+		self.mainHits = hitIndex(self.settings.Width, self.settings.Height)
+		self.layoutButtons()
+
+		# Set up GPIO buttons. Presses are detected by edge callbacks from the
+		# GPIO library, queued and a GPIOEVENT posted to wake up the main loop
+		self.gpioIn = gpioInput(GPIO, self.gpioEdge)
 		for b in self.GPIObuttons:
-			print "Defining button GPIO" + str(b['pin'])
-			GPIO.setup(b['pin'], GPIO.IN, pull_up_down=GPIO.PUD_UP)
+			self.addGPIO(b.config)
 
-		# And the piezo buzzer
-		if(self.Piezo=="yes"):
-			GPIO.setup(self.Piezo_pin, GPIO.OUT)
+		# And the piezo buzzer, beeps play in the background
+		self.buzzer = None
+		if(self.settings.Piezo):
+			GPIO.setup(self.settings.Piezo_pin, GPIO.OUT)
+			self.buzzer = piezo(GPIO, self.settings.Piezo_pin, self.settings.Piezo_duration)
 
 		# Set last active timer, used for screen saver
 		self.lastActive = pygame.time.get_ticks()
 		self.screenSaveOn = False
+		self.saver = screenSaver(self.settings.Width, self.settings.Height, self.settings.screenSaveSpeed,
+			self.settings.screenSaveFPS, self.settings.screenBlank)
 		self.fileManMode = False		# Do not start in file manager
-
-		# Last status used for status updates
-		self.lastStatusTime=0
+		# Print details, shown in place of the buttons by tapping the status bar
+		self.dashMode = False
+		self.dash = dashboard((0, 0, self.settings.Width, self.settings.Height-self.statusSize),
+			statusFont, saverFont, self.butText, self.dashColour, self.progColour)
+
+		# All HTTP requests share one pooled, keep-alive client. While OctoPrint
+		# is down the breaker stops it being called, trying again less often
+		self.breaker = circuitBreaker(self.settings.breakerFailures, self.settings.statRefresh/1000.0,
+			self.settings.statBackoff/1000.0)
+		self.client = octoClient(self.APIheader, self.settings.connectTimeout, self.settings.requestTimeout,
+			self.settings.retries, self.settings.retryBackoff, self.breaker)
+
+		# Screen saver content, watched in the background
+		self.saverText = saverContent(self.settings.screenFile, self.client, self.settings.OctoURL,
+			self.settings.screenSavePoll, self.saverChanged)
+
+		# Files on OctoPrint, each folder fetched when the file manager opens it
+		self.fileTree = fileTree(self.client, self.urls['filelist'],
+			[g[1] for g in self.fileGroups if g[1] is not None])
+		self.fileFolder = self.fileTree.folder()
+		# Changes to the file list from command workers, functions waiting
+		# to be run on this thread
+		self.fileUpdates = collections.deque()
+		self.fileView = listView((25, 10, self.settings.Width-25, self.totalFiles*self.fileRowHeight),
+			self.fileRowHeight, self.fileFolder, self.drawFileRow, self.background)
+		self.fileSort = 0		# Index in to fileSorts
+		self.fileGroup = 0		# Index in to fileGroups
+		self.fileBarRect = pygame.Rect(0, self.settings.Height-self.fileBarHeight, self.settings.Width, self.fileBarHeight)
+		self.fileBarDirty = True
+		# The arrows, only shown when the list can scroll that way
+		self.upIcon = self.fileManIcon('img', 'up_icon', (5,8))
+		self.upIcon.setImage(self.upArrowImg)
+		self.downIcon = self.fileManIcon('img', 'down_icon', (5,self.fileView.rect.bottom-15))
+		self.downIcon.setImage(self.downArrowImg)
+		# Where the arrows and bar buttons are, for finding touches
+		self.fileHits = hitIndex(self.settings.Width, self.settings.Height)
+		self.fileHits.add(self.upIcon.rect, self.upIcon)
+		self.fileHits.add(self.downIcon.rect, self.downIcon)
+		for rect, g in self.fileBarButtons():
+			self.fileHits.add(rect, g)
+
+		# Commands are run by background workers, printer commands in order
+		self.commands = commandQueue(self.settings.commandWorkers, self.settings.commandQueue,
+			self.commandsChanged)
+		self.lastCommandState = None
+
+		# Status is polled on a background thread, which posts a STATUSEVENT
+		# whenever it publishes a new snapshot. The buttons, connect button and
+		# status bar change with the printer state
+		self.printer = printerState(octoStatus(STARTING, "0", "0", None))
+		self.printer.listen(self.stateChanged)
+		self.connectMode = connectMode(STARTING)
+		# Status responses which have not changed are not parsed again
+		self.responses = responseCache(self.client)
+		self.poller = statusPoller(self.getOctoStatus, self.settings.statRefresh, self.statusChanged,
+			self.printer.status,
+			lambda: self.push is not None and self.push.isLive(),
+			self.settings.statIdle, self.settings.statBackoff, self.breaker.retryIn)
+
+		# Optional push status from OctoPrint, polling is only used while it is
+		# down. Its snapshots are published through the poller
+		self.push = None
+		if(self.settings.Push):
+			if(octoPush.available()):
+				self.push = octoPush(self.urls['push'],
+					pushStatus(self.poller.update, self.fileTree.invalidate, self.printTextWidth),
+					self.pushLogin, throttle=self.settings.pushThrottle)
+			else:
+				print "Push status needs the websocket-client module, polling instead"
+
+		# Does the screen need redrawing? Set whenever something visible changes
+		self.dirty = True
+		self.firstFrame = True
+		self.clock = pygame.time.Clock()
+		self.frames = 0
+		# What was last drawn, so only changes are redrawn
+		self.drawMode = None
+		self.lastStatusLine = None
+		self.lastShowConnect = None
+		# Pixels sent to the display in the last frame and since the last report
+		self.framePixels = 0
+		self.pixelsPushed = 0
+		self.lastCpuTime = sum(os.times()[:2])
+		self.lastCpuCheck = pygame.time.get_ticks()
+		self.lastTextHits = 0
+		self.lastTextMisses = 0
+
+		# Changes to the config file are used without restarting
+		self.configWatch = None
+		if(self.settings.configCheck>0):
+			self.configWatch = configWatcher(self.configFile, config,
+				self.settings.configCheck, self.configChanged)
 
 		print "Init complete"
 
+	def makeButtons(self, configs, format):
+		# Button data for each button config. Used again when the config file
+		# changes, when any button whose config is the same is kept as it is
+		if(format==SOFT):
+			old = getattr(self, 'Buttons', [])
+		else:
+			old = getattr(self, 'GPIObuttons', [])
+		keep = {}
+		for b in old:
+			keep.setdefault(b.config, []).append(b)
+		buttons = []
+		for c in configs:
+			if(keep.get(c)):
+				buttons.append(keep[c].pop(0))
+			else:
+				buttons.append(button(c, format))
+		return buttons
+
+	def layoutButtons(self):
+		# Calculate size
+		Padding=6
+		BPR=self.settings.BPR
+		bWidth=int((self.settings.Width-(Padding*BPR))/BPR)-1
+		bRows=max(1, -(-len(self.Buttons)//BPR))
+		print "Length={0}, Buttons per row={1}, required rows = {2}".format(len(self.Buttons),BPR,bRows)
+		bHeight=int((self.settings.Height-self.statusSize-(Padding*bRows))/bRows)
+
+		# Define the buttons, moving any kept from an earlier config
+		vRow=0
+		vCol=0
+		for b in self.Buttons:
+			x=((bWidth+Padding)*vCol)+Padding
+			y=((bHeight+Padding)*vRow)+Padding
+			if(b.buttonObj is not None):
+				b.buttonObj.setGeometry(x, y, bWidth, bHeight)
+			else:
+				print "Defining button " + b.label
+				b.buttonObj=miniScButton(x, y, bWidth, bHeight, b.label, self.butBorder, self.butText, self.butHighlight, 1)
+			vCol=vCol+1
+			if(vCol==BPR):
+				vCol=0
+				vRow=vRow+1
+		# Which are shown in each printer state
+		self.visibleTable = visibilityTable(self.Buttons)
+
+		# Where each button is, the connect button and the rest of the status
+		# bar too
+		self.mainHits.clear()
+		for b in self.Buttons:
+			self.mainHits.add(b.buttonObj.BoundBox, b)
+		self.mainHits.add(self.connectButton.BoundBox, self.connectButton)
+		self.mainHits.add(self.statusArea, self.statusArea)
+
+	def addGPIO(self, c):
+		print "Defining button GPIO" + str(c.pin)
+		self.gpioIn.add(c.pin, c.bounce, c.longPress, c.repeat)
+
+	def configChanged(self):
+		# Called from the config watcher thread, wake up the main loop
+		pygame.event.post(pygame.event.Event(CONFIGEVENT))
+
+	def applyConfig(self):
+		# Swap in an edited config file, or show why it could not be used
+		config, error = self.configWatch.latest
+		if(error is not None):
+			print "Config error, still using the old config: " + error
+			self.configError = error.splitlines()[0]
+			return
+		self.configError = None
+		if(config is self.config):
+			return
+		old = self.config
+		self.config = config
+		print "Config file changed"
+
+		# Most settings are read as they are used, so just need swapping
+		fixed = [f for f in restartSettings if getattr(config.settings, f)!=getattr(old.settings, f)]
+		if(fixed):
+			print "  Restart to change " + ", ".join(fixed)
+		self.settings = config.settings._replace(**dict((f, getattr(self.settings, f)) for f in restartSettings))
+		self.poller.setIntervals(self.settings.statRefresh, self.settings.statIdle, self.settings.statBackoff)
+		self.breaker.threshold = self.settings.breakerFailures
+		self.breaker.delay = self.settings.statRefresh/1000.0
+		self.breaker.maxDelay = self.settings.statBackoff/1000.0
+		if(self.settings.textCacheKB is not None):
+			textCache.cache.maxBytes = self.settings.textCacheKB*1024
+		self.saver.speed = self.settings.screenSaveSpeed
+		self.saver.tick = 1000//self.settings.screenSaveFPS
+		self.saver.deepAfter = self.settings.screenBlank*1000
+
+		# Only lay out the buttons again if they have changed
+		if(config.buttons!=old.buttons or config.settings.BPR!=old.settings.BPR):
+			self.Buttons = self.makeButtons(config.buttons, SOFT)
+			self.layoutButtons()
+			self.setVisibility()
+			self.drawMode = None
+
+		# Only set up GPIO pins again if what they do on the pin has changed
+		if(config.gpioButtons!=old.gpioButtons):
+			timing = lambda c: (c.bounce, c.longPress, c.repeat)
+			before = dict((b.pin, b.config) for b in self.GPIObuttons)
+			after = dict((c.pin, c) for c in config.gpioButtons)
+			for pin, c in before.items():
+				if(pin not in after or timing(after[pin])!=timing(c)):
+					self.gpioIn.remove(pin)
+			for pin, c in after.items():
+				if(pin not in before or timing(before[pin])!=timing(c)):
+					self.addGPIO(c)
+			self.GPIObuttons = self.makeButtons(config.gpioButtons, HARD)
+			self.gpioByPin = dict((b.pin, b) for b in self.GPIObuttons)
+
+	def nextWake(self):
+		# How many milliseconds can the main loop sleep before it has work to do?
+		# 0 if something is due now
+		timeNow = pygame.time.get_ticks()
+		if(self.screenSaveOn):
+			# Nothing to do in deep idle until woken by an event
+			wait = self.saver.nextWake()
+			deadline = timeNow+(wait if wait is not None else 3600000)
+		else:
+			deadline = self.lastActive+self.settings.screenSave*1000
+		if(self.fileManMode and self.fileView.moving()):
+			# Next frame of a flung file list
+			deadline = min(deadline, timeNow+1000//self.settings.maxFPS)
+		if(self.drawMode in ("main", "dash") and self.printer.state==OFFLINE and self.breaker.retryIn() is not None):
+			# Count down to the next reconnect on the status bar
+			deadline = min(deadline, timeNow+1000)
+		if(self.settings.cpuReport>0):
+			# The CPU report is due, most of all when idle
+			deadline = min(deadline, self.lastCpuCheck+self.settings.cpuReport*1000)
+		return max(0, deadline-timeNow)
+
 	def Start(self):
 		# Starting panel
 		print "Starting OctoMiniScreen"
-
-
-		# Main loop
+		self.poller.start()
+		if(self.push is not None):
+			self.push.start()
+		self.saverText.start()
+		self.commands.start()
+		if(self.configWatch is not None):
+			self.configWatch.start()
+
+		# Main loop. Sleep until an input event, GPIO edge or the next timer
+		# deadline, then only redraw if something has changed
 		while not self.vQuit:
-			# Handle events
-			self.handleEvent()
-
-			# Get the Octoprint server status
-			if(pygame.time.get_ticks()>(self.lastStatusTime+self.statRefresh)):
-				# Reset check time
-				self.lastStatusTime=pygame.time.get_ticks()
-				s = self.getOctoStatus()
-				#print "Return from status: " + str(s)
-
-				# Have we changed state?
-				if(s != self.octoPstate):
-					self.octoPstate=s
-					# Update button visibility
-					for b in self.Buttons:
-						if((self.octoPstate>=1 and self.octoPstate<=3) and (b['visible']=='o' or b['visible']=='p')):
-							b['buttonObj'].active=0
-						elif(self.octoPstate==4 and b['visible']=='p'):
-							b['buttonObj'].active=0
-						elif(self.octoPstate==5 and (b['visible']=='o' or b['visible']=='p')):
-							# Show o and p buttons when paused
-							b['buttonObj'].active=1
-						else:
-							b['buttonObj'].active=1
+			# Handle events. pygame 1.9 can not wait with a timeout, so a timer
+			# posts WAKEEVENT when the next deadline is due. If something is
+			# already due only take an event which is waiting
+			wait = self.nextWake()
+			if(wait>0):
+				pygame.time.set_timer(WAKEEVENT, wait)
+				event = pygame.event.wait()
+				pygame.time.set_timer(WAKEEVENT, 0)
+			else:
+				event = pygame.event.poll()
+			self.handleEvent(event)
+
+			# Keep a flung file list moving
+			if(self.fileManMode and self.fileView.moving()):
+				self.fileView.update()
+				self.dirty = True
 
 			# Do we show the screen saver?
-			if(self.lastActive+self.screenSave < pygame.time.get_ticks()):
+			if(not self.screenSaveOn and self.lastActive+self.settings.screenSave*1000 <= pygame.time.get_ticks()):
 				self.screenSaveOn = True
-
-			# Draw the screen
-			self.draw()
+				self.saver.start()
+				self.dirty = True
+
+			# Only check screen saver content while it is showing
+			self.saverText.setActive(self.screenSaveOn)
+
+			# The reconnect countdown changes the status bar on its own
+			if(self.drawMode in ("main", "dash") and self.printer.state==OFFLINE and self.statusLine()!=self.lastStatusLine):
+				self.dirty = True
+
+			# Screen saver text moves on a timer
+			if(self.screenSaveOn and self.saver.isDue()):
+				self.dirty = True
+
+			# Draw the screen, capped at maxFPS
+			if(self.dirty):
+				self.dirty = False
+				self.draw()
+				self.frames += 1
+				if(self.firstFrame):
+					self.firstFrame = False
+					print "First frame drawn {0:.2f}s after launch".format(time.time()-launchTime)
+				self.clock.tick(self.settings.maxFPS)
+
+			self.checkCpu()
+		self.poller.stop()
+		if(self.push is not None):
+			self.push.stop()
+		self.saverText.stop()
+		self.commands.stop()
+		if(self.configWatch is not None):
+			self.configWatch.stop()
+		self.saver.stop()
+		self.client.close()
 		print "Application quit, bye bye"
 
+	def checkCpu(self):
+		# Report CPU use of this process, so the idle cost can be verified
+		if(self.settings.cpuReport<=0):
+			return
+		timeNow = pygame.time.get_ticks()
+		elapsed = (timeNow-self.lastCpuCheck)/1000.0
+		if(elapsed < self.settings.cpuReport):
+			return
+		cpuNow = sum(os.times()[:2])
+		cpuPct = 100.0*(cpuNow-self.lastCpuTime)/elapsed
+		print "CPU {0:.1f}% over {1:.0f}s, {2} frames drawn, {3} pixels pushed".format(cpuPct, elapsed, self.frames, self.pixelsPushed)
+		if(cpuPct > self.settings.idleCpuTarget):
+			print "  Above idle CPU target of {0}%".format(self.settings.idleCpuTarget)
+		print "  HTTP {0} requests over {1} connections".format(*self.client.stats())
+		responses, unchanged, skipped, unparsed = self.responses.stats()
+		if(responses):
+			print "  Status responses {0} of {1} unchanged ({2:.0f}%), {3}KB not downloaded, {4}KB not parsed".format(unchanged, responses, 100.0*unchanged/responses, skipped//1024, unparsed//1024)
+		hits, misses, count, size = textCache.cache.stats()
+		print "  Text cache {0} hits, {1} misses, {2} surfaces using {3}KB".format(hits-self.lastTextHits, misses-self.lastTextMisses, count, size//1024)
+		self.lastTextHits = hits
+		self.lastTextMisses = misses
+		self.lastCpuTime = cpuNow
+		self.lastCpuCheck = timeNow
+		self.frames = 0
+		self.pixelsPushed = 0
+
 	def draw(self):
+		# Only the parts of the screen which have changed are redrawn and sent
+		# to the display, unless we have just switched to a different view
+		if(self.screenSaveOn):
+			mode = "saver"
+		elif(self.fileManMode):
+			mode = "fileman"
+		elif(self.dashMode):
+			mode = "dash"
+		else:
+			mode = "main"
+		full = (mode!=self.drawMode)
+		self.drawMode = mode
+
 		if(self.screenSaveOn):
-			# Can't control the backlight with the waveshare screen, just show black
-			self.screen.fill( [0,0,0] )
-			# If OctoPrint is connected, show data on the screen saver
-			self.ssaveData()
+			# Black, with the text moving around if OctoPrint is connected
+			if(full):
+				self.screen.fill( [0,0,0] )
+			rects = self.ssaveData()
+			if(full):
+				rects = None
 
 		elif(self.fileManMode):
 			# Show the file manager
-			self.showFileman()
+			rects = self.showFileman(full)
+		elif(self.dashMode):
+			rects = self.drawDash(full)
 		else:
+			rects = self.drawMain(full)
+
+		# Update the display and count the pixels pushed to it
+		if(rects is None):
+			pygame.display.update()
+			self.framePixels = self.settings.Width*self.settings.Height
+		elif(rects):
+			pygame.display.update(rects)
+			self.framePixels = sum(r.w*r.h for r in rects)
+		else:
+			self.framePixels = 0
+		self.pixelsPushed += self.framePixels
+
+	def drawMain(self, full):
+		# Draw the buttons and status bar. Returns the list of areas changed
+		rects = []
+		if(full):
 			# Set background
 			self.screen.fill( self.background )
 
-			# Show buttons
-			for b in self.Buttons:
-				b['buttonObj'].draw(self.screen)
-
-			# Show status bar
-			if(self.octoPstate==0):
-				# Octo print running fine, show printer/job status
-				statLine = statusFont.render("Running...", 1, (0,200,0))
-			elif(self.octoPstate==1):
-				statLine = statusFont.render("Error connecting to Octoprint", 1, (200,130,0))
-			elif(self.octoPstate==2):
-				statLine = statusFont.render("Error: Octoprint not running", 1, (200,0,0))
-			elif(self.octoPstate==3):
-				statLine = statusFont.render("Printer not connected", 1, (200,130,0))
-			elif(self.octoPstate==4):
-				statLine = statusFont.render("Printing: "+self.vProgress, 1, (0,200,0))
-			elif(self.octoPstate==5):
-				statLine = statusFont.render("Paused: "+self.vProgress, 1, (0,200,0))
-			elif(self.octoPstate==6):
-				statLine = statusFont.render("Pausing......", 1, (0,200,0))
-			elif(self.octoPstate==7):
-				statLine = statusFont.render("Ready: "+self.vProgress, 1, (0,200,0))
-			else:
-				statLine = statusFont.render("Unknown state!", 1, (200,130,0))
-			self.screen.blit(statLine, (5,(self.Height-self.statusSize)+10))
+		# Show buttons
+		for b in self.Buttons:
+			if(full or b.buttonObj.dirty):
+				rects.append(b.buttonObj.draw(self.screen, self.background))
+		rects += self.drawStatusBar(full)
 
-			if(self.vShowConnect>0):
-				self.connectButton.draw(self.screen)
+		if(full):
+			return [self.screen.get_rect()]
+		return rects
 
-		pygame.display.update()
+	def drawDash(self, full):
+		# Draw the print details and status bar. Returns the list of areas changed
+		if(full):
+			self.screen.fill( self.background )
+		rects = self.dash.draw(self.screen, self.background, self.printer.status.details, full)
+		rects += self.drawStatusBar(full)
+
+		if(full):
+			return [self.screen.get_rect()]
+		return rects
+
+	def drawStatusBar(self, full):
+		# Show status bar, if anything on it has changed. Returns the areas changed
+		rects = []
+		statLine = self.statusLine()
+		showConnect = self.connectMode!=NO_ACTION
+		commandState = self.commands.state()
+		if(full or statLine!=self.lastStatusLine or showConnect!=self.lastShowConnect or self.connectButton.dirty
+				or commandState!=self.lastCommandState):
+			self.lastStatusLine = statLine
+			self.lastShowConnect = showConnect
+			self.lastCommandState = commandState
+			statusRect = pygame.Rect(0, self.settings.Height-self.statusSize, self.settings.Width, self.statusSize)
+			self.screen.fill(self.background, statusRect)
+			self.screen.blit(renderText(statusFont, statLine[0], 1, statLine[1]), (5,(self.settings.Height-self.statusSize)+10))
+
+			# Commands waiting to run show amber, failed ones red
+			pending, failed = commandState
+			if(pending or failed):
+				colour = (230,160,0) if pending else (220,0,0)
+				pygame.draw.circle(self.screen, colour, (self.settings.Width-95, statusRect.centery), 5)
+
+			if(showConnect):
+				self.connectButton.draw(self.screen)
+			self.connectButton.dirty = False
+			rects.append(statusRect)
+		return rects
+
+	def statusLine(self):
+		# Status bar text and colour for the current state
+		if(self.configError is not None):
+			return ("Config: "+self.configError, (200,0,0))
+		state = self.printer.state
+		if(state==OFFLINE):
+			wait = self.breaker.retryIn()
+			if(wait is not None):
+				return ("Octoprint down, reconnecting in {0}s".format(int(math.ceil(wait))), (200,0,0))
+		text, colour = self.statusTexts.get(state, ("Unknown state!", (200,130,0)))
+		return (text.format(self.printer.status.progress), colour)
 
 	def ssaveData(self):
+		# Draw the screen saver text at its next position. Returns the areas changed
+		lines = []
 		# Only show screen saver if OctoPrint is running
-		if(self.octoPstate==0 or self.octoPstate>=4):
-			try:
-				f=open(self.screenFile, "r")
-				# File exists, should be one line
-				fstr=f.read()
-				f.close()
-			except IOError:
-				fstr=""
-			fileLine = saverFont.render(fstr, 1, self.fileColour)
-			self.screen.blit(fileLine, (self.screenSavePos[0],self.screenSavePos[1]))
+		if(self.printer.state in CONNECTED):
+			# Content is read in the background, one line per source
+			for fstr in self.saverText.lines():
+				lines.append(renderText(saverFont, fstr, 1, self.fileColour))
 
 			# If the printer is printing, show a status line
-			if(self.octoPstate==4):
-				progLine = saverFont.render(self.vProgMini, 1, self.progColour)
-				self.screen.blit(progLine, (self.screenSavePos[0],self.screenSavePos[1]+24))
-
-			# Do we need to move the cursor?
-			if(self.nextSSaveMove<time.clock()) :
-
-
-				#Move the cursor for next time
-				# Direction: 0=Down,1=right,2=up,3=left
-				if(self.screenSaveDirection==0):
-					# Down - y++
-					self.screenSavePos[1]+=1
-					if(self.screenSavePos[1]>self.screenSaveLimit[1]):
-						self.screenSaveDirection=1
-				if(self.screenSaveDirection==1):
-					# Right - x++
-					self.screenSavePos[0]+=1
-					if(self.screenSavePos[0]>self.screenSaveLimit[0]):
-						self.screenSaveDirection=2
-				if(self.screenSaveDirection==2):
-					# Up - y--
-					self.screenSavePos[1]-=1
-					if(self.screenSavePos[1]<10):
-						self.screenSaveDirection=3
-				if(self.screenSaveDirection==3):
-					# Left - x--
-					self.screenSavePos[0]-=1
-					if(self.screenSavePos[0]<10):
-						self.screenSaveDirection=0
-				self.nextSSaveMove+=self.screenSaveSpeed
-
-
+			if(self.printer.state==PRINTING):
+				lines.append(renderText(saverFont, self.printer.status.progMini, 1, self.progColour))
+		return self.saver.draw(self.screen, lines)
 
 	# Events to handle:
 	#  MOUSEBUTTONDOWN pos,button
 	#  MOUSEBUTTONUP pos,button
-	def handleEvent(self):
+	#  GPIOEVENT
+	#  STATUSEVENT
+	#  SAVEREVENT
+	#  CONFIGEVENT
+	#  COMMANDEVENT
+	#  FILESEVENT
+	def handleEvent(self, first=None):
 		# Handle events
 
-		# Check for pygame events
-
-		for event in pygame.event.get():
+		# Check for pygame events, including the one which woke the main loop
+		events = pygame.event.get()
+		if(first is not None and first.type!=pygame.NOEVENT):
+			events.insert(0, first)
+
+		for event in events:
+			if(event.type==WAKEEVENT):
+				# Only there to end the wait, the main loop checks what is due
+				continue
+			# Anything we act on needs a redraw, moves only matter to the file list
+			if(event.type!=pygame.MOUSEMOTION or self.fileManMode):
+				self.dirty = True
 			if (event.type==pygame.QUIT):
 				self.vQuit=True
+			elif (event.type==STATUSEVENT):
+				self.applyStatus(self.poller.status)
+			elif (event.type==CONFIGEVENT):
+				self.applyConfig()
+			elif (event.type==COMMANDEVENT):
+				# Only the status bar indicator changes
+				pass
+			elif (event.type==FILESEVENT):
+				# Changes to the file list made in the background
+				while self.fileUpdates:
+					self.fileUpdates.popleft()()
+			elif (event.type==GPIOEVENT):
+				for pin, kind in self.gpioIn.get():
+					b = self.gpioByPin.get(pin)
+					if(b is not None):
+						print "Button " + kind + " on pin " + str(pin)
+						self.handleClick(b, kind=="long")
+				self.lastActive = pygame.time.get_ticks()
+			elif (event.type==pygame.MOUSEMOTION):
+				# Only the file list uses drags
+				if(self.fileManMode and not self.screenSaveOn):
+					self.handleFileman(event)
 			elif (event.type==pygame.MOUSEBUTTONDOWN or event.type==pygame.MOUSEBUTTONUP):
 				# First click with screensaver on removes it
 				if(self.screenSaveOn):
 					self.screenSaveOn = False
+					self.saver.stop()
 				elif(self.fileManMode):
 					self.handleFileman(event)
+				elif(self.dashMode):
+					self.handleDash(event)
 				else:
-					#Ignore clicks if insufficient time has passed since last one
+					# Mousebutton change, test the buttons under it. Clicks on
+					# a button too soon after its last one are ignored
 					timeNow=pygame.time.get_ticks()
-					if(timeNow>self.nextClick):
-						# Mousebutton change, test all buttons
-						for b in self.Buttons:
-							if(b['buttonObj'].handleEvent(event)==2):
-								# Button has been clicked
+					for b in self.mainHits.find(event.pos):
+						if(b is self.connectButton):
+							self.clickConnect(event)
+						elif(b is self.statusArea):
+							if(event.type==pygame.MOUSEBUTTONUP):
+								self.dashMode = True
+						elif(b.buttonObj.handleEvent(event)==2):
+							# Button has been clicked
+							if(timeNow>b.nextClick):
+								b.nextClick=timeNow+b.config.debounce
 								self.handleClick(b)
-								# Reset the click timer
-								self.nextClick=timeNow+self.click_delay
-
-						# Has the connect button been clicked?
-						if(self.vShowConnect>0):
-							if(self.connectButton.handleEvent(event)==2):
-								# Yes, beep it
-								if(self.Piezo=="yes"):
-									self.piezoChirp()
-								if(self.vShowConnect==1):
-									self.connectPrinter()
-								elif(self.vShowConnect==2):
-									self.pausePrinter()
-								elif(self.vShowConnect==3):
-									self.resumePrinter()
-								elif(self.vShowConnect==4):
-									self.printFile()
-								elif(self.vShowConnect==5):
-									self.fileManMode=True
-									# Reset the index
-									self.fileStart = 0
-									self.refreshFileList()
-								# Reset the click timer
-								self.nextClick=timeNow+self.click_delay
-
-					else:
-						print "Too quick, just wait"
+							else:
+								print "Too quick, just wait"
 				# Reset the last active timer
 				self.lastActive = pygame.time.get_ticks()
 
 		# End of pygame events
 
-		# Check for GPIO events (pull up so 0 = press)
-		for b in self.GPIObuttons:
-			if(GPIO.input(b['pin'])==0):
-				print "Button press on pin " + str(b['pin'])
-				self.handleClick(b)
-				# Delay to avoid switch bounce
-				time.sleep(0.5)
-
+	def gpioEdge(self):
+		# Called from a GPIO thread when a button event is queued, wake up
+		# the main loop to handle it
+		pygame.event.post(pygame.event.Event(GPIOEVENT))
 
+	def clickConnect(self, event):
+		# Has the connect button been clicked? Clicks too soon after the last
+		# one are ignored
+		if(self.connectMode!=NO_ACTION and self.connectButton.handleEvent(event)==2):
+			timeNow=pygame.time.get_ticks()
+			if(timeNow>self.nextConnectClick):
+				self.nextConnectClick=timeNow+self.settings.click_delay
+				self.connectClicked()
+			else:
+				print "Too quick, just wait"
+
+	def handleDash(self, event):
+		# The connect button works as on the main screen, a tap anywhere else
+		# goes back to the buttons
+		if(self.connectButton.BoundBox.collidepoint(event.pos)):
+			self.clickConnect(event)
+		elif(event.type==pygame.MOUSEBUTTONUP):
+			self.dashMode = False
+
+	def connectClicked(self):
+		# Beep it and do whatever the connect button shows
+		self.piezoChirp()
+		if(self.connectMode==CONNECT):
+			self.queueCommand(self.connectPrinter, None, self.settings.commandTimeout, 'printer', 'connect')
+		elif(self.connectMode==PAUSE):
+			self.queueCommand(self.pausePrinter, None, self.settings.commandTimeout, 'printer', 'pause')
+		elif(self.connectMode==RESUME):
+			self.queueCommand(self.resumePrinter, None, self.settings.commandTimeout, 'printer', 'resume')
+		elif(self.connectMode==PRINT):
+			self.queueCommand(self.printFile, None, self.settings.commandTimeout, 'printer', 'print')
+		elif(self.connectMode==FILEMAN):
+			self.dashMode=False
+			self.fileManMode=True
+			# Reset the index
+			self.openFolder("")
 
 	# Handle Mouse Click
-	def handleClick(self, cButton):
+	def handleClick(self, cButton, long=False):
 		# Button has been clicked, toggle if needed and execute command
+		# A long press on a GPIO button runs its long command, no toggling
 
-		if(self.Piezo=="yes"):
-			self.piezoChirp()
-
-		print cButton['label'] + " clicked"
-		eCmd = cButton['command']
-		# Deal with toggle buttons
-		if(cButton['type']=="toggle"):
-			l=len(cButton['toggleCmds'])
-			cButton['currentState']+=1
-			if(cButton['currentState']==l):
-				cButton['currentState']=0
-			if(cButton['format']=="soft"):
-				cButton['label']=cButton['toggleOpts'][cButton['currentState']]
-				cButton['buttonObj'].text=cButton['label']
-			cButton['command']=cButton['toggleCmds'][cButton['currentState']]
-
-
-		# Break up command to find type
-		print "  Executing command " + eCmd
-		sp=eCmd.split(':',1)
-		if(len(sp)==0):
-			print "Error: Can not parse this command:" + sp
-			return
+		self.piezoChirp()
+
+		if(long):
+			print cButton.label + " long press"
+			eCmd, kind, arg = cButton.config.longCommand
+		else:
+			print cButton.label + " clicked"
+			eCmd, kind, arg = cButton.command
+			# Deal with toggle buttons
+			if(cButton.type==TOGGLE):
+				cButton.toggle()
+
+
+		# Command was split into type and arguments when the config was read.
+		# It is queued, OctoPrint commands run in order and URLs alongside them
+		print "  Queueing command " + eCmd
+		timeout = cButton.config.timeout
 		# What type of command is this?
-		if(sp[0]=="GCODE"):
-			self.executeGcode(sp[1])
-		elif(sp[0]=="API"):
-			self.executeAPIcommand(sp[1])
-		elif(sp[0]=="URL"):
-			self.visitURL(sp[1])
+		if(kind=="GCODE"):
+			if(arg):
+				self.queueCommand(self.sendGcode, arg, timeout, 'printer', eCmd)
+		elif(kind=="API"):
+			self.queueCommand(self.executeAPIcommand, arg, timeout, 'printer', eCmd)
+		elif(kind=="URL"):
+			self.queueCommand(self.visitURL, arg, timeout, None, eCmd)
 		else:
-			print "No method to handle command type: " + sp[0]
+			print "No method to handle command type: " + kind
+
+	def queueCommand(self, func, arg, timeout, target, key):
+		# Run func(arg, timeout) on a command worker, beeping if it fails or
+		# can not be queued. Pressing again while it waits does nothing.
+		# Commands with the same target run in order, None for any order
+		def run(timeout):
+			try:
+				ok = func(arg, timeout)
+			except requests.exceptions.RequestException as e:
+				print "Command " + key + " failed: " + str(e)
+				ok = False
+			if(not ok):
+				self.piezoChirp('error')
+			# The printer state has probably changed, show it now
+			self.poller.poke()
+			return ok
+		if(self.commands.submit(run, timeout, target, key)==FULL):
+			self.piezoChirp('error')
+
+	def commandsChanged(self):
+		# Called from the command workers, redraw the indicator
+		pygame.event.post(pygame.event.Event(COMMANDEVENT))
 
 	def getAPIrequest(self, url=None):
 		#print "Getting request - " + url
 		try:
-			response = requests.get(url, headers=self.APIheader)
+			response = self.client.get(url)
 			return response
 		except requests.exceptions.ConnectionError as e:
 			print "Connection error ({0}): {1}".format(e.errno, e.strerror)
 			return None
 
-	def postAPIrequest(self, url=None, payload=None):
+	def postAPIrequest(self, url=None, payload=None, timeout=None):
 		if(payload is None):
 			try:
 				print "  No payload, just call URL"
-				response = requests.post(url, headers=self.APIheader)
+				response = self.client.post(url, timeout=timeout)
 				print "  Post response was "+str(response.status_code)
 				return response
 			except requests.exceptions.ConnectionError as e:
@@ -583,17 +913,17 @@ class OctoMiniScreen():
 		else:
 			print "Posting payload "+payload+" to " + url
 			try:
-				response = requests.post(url, json=json.loads(payload), headers=self.APIheader)
+				response = self.client.post(url, json=json.loads(payload), timeout=timeout)
 				print "  Post response was "+str(response.status_code)
 				return response
 			except requests.exceptions.ConnectionError as e:
 				print "Connection error ({0}): {1}".format(e.errno, e.strerror)
 				return None
 
-	def deleteAPIrequest(self, url=None):
+	def deleteAPIrequest(self, url=None, timeout=None):
 		print("Sending delete request to URL", url)
 		try:
-			response = requests.delete(url, headers=self.APIheader)
+			response = self.client.delete(url, timeout=timeout)
 			print("  Request response was "+str(response.status_code))
 			if(response.status_code==204):
 				print("  Deleted")
@@ -606,303 +936,361 @@ class OctoMiniScreen():
 			print "Connection error ({0}): {1}".format(e.errno, e.strerror)
 			return None
 
-	def getOctoStatus(self):
-		# Is Octopi running. 0=Yes OK, 1=yes but error, 2=Critical - not running
-		# 3=connected no printer, 4=printing, 5=paused, 6=pausing
-		try:
-			r = requests.get(self.urls['version'], headers=self.APIheader)
-			#print "Printer status code="+str(r.status_code)
-			if (r.status_code==200):
-				# We are up and running, what about the connection status?
-				printResp = self.getAPIrequest(self.urls['connection'])
-				#print "Printer connection status is "+str(printResp.status_code)
-				if(printResp.status_code==200):
-					rj = printResp.json()
-					vState=rj["current"]["state"]
-					#print "State="+vState
-					if(vState=="Operational"):
-						# Got a printer, good to go
-						self.vShowConnect = 0
-						i = self.getFileInfo();
-						if(i==7):
-							# There is a file loaded but we are not printing
-							# Show a print button
-							self.changeConnectButton(4)
-						elif(i==0):
-							# No file loaded, show a fileman button
-							self.changeConnectButton(5)
-						return i
-					elif(vState=="Printing"):
-						# Show pause
-						self.changeConnectButton(2)
-						self.getPrintProgress()
-						return 4
-					elif(vState=="Paused"):
-						# Show resume
-						self.changeConnectButton(3)
-						return 5
-					elif(vState=="Pausing"):
-						# Report pausing, remove button
-						self.vShowConnect = 0
-						return 6
-
-				# No printer found
-				if(self.vShowConnect!=1):
-					# Show the connect button
-					self.changeConnectButton(1)
-				return 3
-			else:
-				# Some sort of error, don't care what
-				return 1
-		except requests.exceptions.ConnectionError as e:
-			print "Connection error ({0}): {1}".format(e.errno, e.strerror)
-			return 2
-
-	def changeConnectButton(self, newState):
-		# Change the connect button to show connect, pause or resume
-		self.vShowConnect=newState
-		if(self.vShowConnect==1):
-			self.connectButton.text="Connect"
-		elif(self.vShowConnect==2):
-			self.connectButton.text="Pause"
-		elif(self.vShowConnect==3):
-			self.connectButton.text="Resume"
-		elif(self.vShowConnect==4):
-			self.connectButton.text="Print"
-		elif(self.vShowConnect==5):
-			self.connectButton.text="Fileman"
-
-	def getPrintProgress(self):
-		# Call printer job to get printer progress
-		try:
-			r = requests.get(self.urls['job'], headers=self.APIheader)
-			if(r.status_code==200):
-				rj = r.json()
-				#print "Progress="+str(rj["progress"]["completion"])
-				if(rj["progress"]["completion"]):
-					p = int(rj["progress"]["completion"])
-				else:
-					p = 0
-				f = rj["job"]["file"]["name"]
-				if(len(f)>self.printTextWidth) :
-					self.vProgress=f[:self.printTextWidth]+"... "+str(p)+"%"
-				else:
-					self.vProgress=f+" - "+str(p)+"%"
-				self.vProgMini=str(p)+"%"
-			else:
-				# An error, lets go with 0%
-				self.vProgress="print job unknown!"
-				self.vProgMini="??%"
-
-		except requests.exceptions.ConnectionError as e:
-			print "Connection error ({0}): {1}".format(e.errno, e.strerror)
-			return 2
-
-	def getFileInfo(self):
-		# Called when not printing. If a file is loaded then show a print button
+	def pollJSON(self, name, deadline, keep=False):
+		# GET used by the status poller, through the response cache. Each
+		# request is tried once, limited by the request timeout and by what is
+		# left of the whole poll cycle deadline. Returns the status code,
+		# parsed JSON and whether it has changed
+		remaining = deadline-time.time()
+		if(remaining<=0):
+			raise requests.exceptions.Timeout("Status poll deadline passed")
+		return self.responses.get(self.urls[name], min(self.settings.requestTimeout, remaining), keep)
+
+	def getOctoStatus(self, prev):
+		# Runs on the status poller thread. Builds a new octoStatus snapshot from
+		# the previous one and never touches the screen
+		deadline = time.time()+self.settings.pollDeadline
 		try:
-			r = requests.get(self.urls['job'], headers=self.APIheader)
-			if(r.status_code==200):
-				rj = r.json()
-				f = rj["job"]["file"]["name"]
-				#print "File="+str(f)
-				if(str(f)=="None"):
-					# Nothing to print
-					#print " No file to print"
-					return 0
-				else:
-					# We have a file, show a print button
-					if(len(f)>self.printTextWidth) :
-						self.vProgress=f[:self.printTextWidth+6]+"..."
-					else:
-						self.vProgress=f
-					return 7
-
-
-			else:
-				# An error, lets go with 0%
-				self.vProgress="FileInfo error"
-
+			# The version can not change while OctoPrint is up, only fetch it once
+			status = pollStatus(prev, lambda name: self.pollJSON(name, deadline, keep=(name=='version')), self.printTextWidth)
+			if(status.state==ERROR):
+				self.responses.forget()
+			return status
+		except circuitOpen:
+			# Still down, the breaker has already said so
+			return failed(prev, OFFLINE)
 		except requests.exceptions.ConnectionError as e:
 			print "Connection error ({0}): {1}".format(e.errno, e.strerror)
-			return 0
-		# Should not reach here
-		return 0
-
+			# It may be a different OctoPrint when it comes back
+			self.responses.forget()
+			return failed(prev, OFFLINE)
+		except requests.exceptions.Timeout as e:
+			print "Status timeout: " + str(e)
+			self.responses.forget()
+			return failed(prev, ERROR)
+
+	def applyStatus(self, status):
+		# Take the latest snapshot published by the status poller or push socket
+		if(self.printer.apply(status)):
+			self.dirty = True
+
+	def stateChanged(self, t):
+		# Called by the printer state when it changes, with the transition
+		if(t.printFinished()):
+			self.piezoChirp('finished')
+		self.changeConnectButton(connectMode(t.new))
+		self.setVisibility()
+
+	def setVisibility(self):
+		# Update button visibility for the current state
+		for buttonObj, active in self.visibleTable.get(self.printer.state, self.visibleTable[None]):
+			buttonObj.active=active
+
+	def saverChanged(self):
+		# Called from the screen saver content thread, redraw if it is showing
+		pygame.event.post(pygame.event.Event(SAVEREVENT))
+
+	def statusChanged(self):
+		# Called from the status poller or push thread, wake up the main loop
+		pygame.event.post(pygame.event.Event(STATUSEVENT))
+
+	def changeConnectButton(self, mode):
+		# Change what the connect button does and shows
+		self.connectMode=mode
+		if(mode in connectLabels):
+			self.connectButton.text=connectLabels[mode]
+
+	def pushLogin(self):
+		# Log in to OctoPrint with the API key so the push socket is sent the
+		# printer status. Returns the auth string for the socket
+		r = self.client.post(self.urls['login'], json={"passive": True})
+		if(r.status_code!=200):
+			print "  Push login failed, status code = " + str(r.status_code)
+			return None
+		rj = r.json()
+		return rj["name"]+":"+rj["session"]
 
-	def connectPrinter(self):
+	# Printer actions, run as queued commands. Each returns True if it worked
+	def connectPrinter(self, arg=None, timeout=None):
 		# Connect to the default printer using defaults
-		r = requests.post(self.urls['connection'], json={"command": "connect"},headers=self.APIheader)
+		r = self.client.post(self.urls['connection'], json={"command": "connect"}, timeout=timeout)
 		print "  Connecting to printer, status code = " + str(r.status_code)
+		return responseOK(r)
 
-	def pausePrinter(self):
+	def pausePrinter(self, arg=None, timeout=None):
 		# Pause the printer
-		self.postAPIrequest(self.urls['job'], '{"command": "pause", "action": "pause"}')
+		return responseOK(self.postAPIrequest(self.urls['job'], '{"command": "pause", "action": "pause"}', timeout))
 
-	def resumePrinter(self):
+	def resumePrinter(self, arg=None, timeout=None):
 		# Resume printing
-		self.postAPIrequest(self.urls['job'], '{"command": "pause", "action": "resume"}')
+		return responseOK(self.postAPIrequest(self.urls['job'], '{"command": "pause", "action": "resume"}', timeout))
 
-	def printFile(self):
+	def printFile(self, arg=None, timeout=None):
 		# Start a print job
-		self.postAPIrequest(self.urls['job'], '{"command": "start"}')
+		return responseOK(self.postAPIrequest(self.urls['job'], '{"command": "start"}', timeout))
 
 	def togglePower(self):
 		# Toggle the printer power supply
-		r = requests.post(self.OctoURL+'/api/plugin/psucontrol', json={"command":"togglePSU"},headers=self.APIheader)
+		r = self.client.post(self.settings.OctoURL+'/api/plugin/psucontrol', json={"command":"togglePSU"})
 		print "  Toggle printer PSU, status code = " + str(r.status_code)
 
-	def executeGcode(self, gcode):
-		print "Executing gcode "+gcode
-		# Break apart commands, reassemble with a ',' and wrap commands in quotes
-		tmpList=gcode.split(';')
-		# Sending list of commands failed, do it sequentially
-		for i in tmpList:
-			r = requests.post(self.urls['command'], json={"command": i}, headers=self.APIheader)
+	def sendGcode(self, gcode, timeout=None):
+		# gcode is the tuple of commands from parseCommand. Send all the
+		# commands in one request. Blank commands are removed by parseCommand,
+		# which is what made sending a list fail before
+		r = self.client.post(self.urls['command'], json={"commands": list(gcode)}, timeout=timeout)
+		print "Sent GCODE "+";".join(gcode)+", response status code = "+str(r.status_code)
+		if(r.status_code==204):
+			return True
+		if(r.status_code!=400):
+			# Not connected, not allowed or similar, sending them one at a
+			# time would fail too
+			return False
+		# The batch was rejected, fall back to sending them one at a time
+		print "  Batch rejected, sending sequentially"
+		ok = True
+		for i in gcode:
+			r = self.client.post(self.urls['command'], json={"command": i}, timeout=timeout)
 			print "Sent GCODE "+i+", response status code = "+str(r.status_code)
+			ok = ok and r.status_code==204
+		return ok
 
-	def executeAPIcommand(self, apicmd):
+	def executeAPIcommand(self, apicmd, timeout=None):
 		print "Executing API command "+apicmd
+		ok = True
 		# Break apart commands, split with a ;
 		tmpList=apicmd.split(';')
 		for cmd in tmpList:
 			# Commands are in the format: url{json}
 			# break apart. Test to see if it does have the {} section
 			cparts=cmd.split('{',1)
-			if (not cparts):
+			if (len(cparts)==2):
 				print "Does have a bracket"
 				# Stick the bracket back
 				cparts[1]='{'+cparts[1]
 				print "  Sending "+cparts[1]+" to URL "+cparts[0]
-				r = self.postAPIrequest(self.OctoURL+cparts[0], cparts[1])
+				r = self.postAPIrequest(self.settings.OctoURL+cparts[0], cparts[1], timeout)
 			else:
 				print "Does not have a bracket"
 				print "  Sending no params to to URL "+cmd
-				r = self.postAPIrequest(self.OctoURL+cmd)
+				r = self.postAPIrequest(self.settings.OctoURL+cmd, None, timeout)
+			ok = ok and responseOK(r)
+		return ok
 
-	def visitURL(self, url=None):
+	def visitURL(self, url=None, timeout=None):
 		if(url is None):
 			print "No URL supplied"
-			return None
+			return False
 		else:
 			print "Visiting URL: "+url
-			response = requests.get(url)
+			response = self.client.get(url, plain=True, timeout=timeout)
 			print "  Post response was "+str(response.status_code)
-			return response
+			return responseOK(response)
 
-	def piezoChirp(self):
-		GPIO.output(self.Piezo_pin, True)
-		time.sleep(self.Piezo_duration)
-		GPIO.output(self.Piezo_pin, False)
+	def piezoChirp(self, pattern='ack'):
+		# Beep if the buzzer is enabled. Patterns are ack, error and finished
+		if(self.buzzer is not None):
+			self.buzzer.play(pattern)
 
 	# **** Fundtions for handling file management. Perhaps should be moved to a different class
-	def showFileman(self):
-		self.screen.fill( self.background )
+	def showFileman(self, full):
+		# Draw the file list and arrows. Returns the areas changed, or None
+		# if the whole screen was drawn
+		self.refreshFileList()
+		arrowRect = pygame.Rect(0, 0, self.fileView.rect.x, self.fileBarRect.y)
+		if(full):
+			self.screen.fill( self.background )
+		else:
+			self.screen.fill( self.background, arrowRect )
 
 		# Display icon list
 		for x in self.fileIconList:
 			#print("Printing icon", x.name)
 			self.screen.blit(x.image, x.pos)
 
+		listRect = self.fileView.draw(self.screen)
+		rects = [arrowRect, listRect]
+		if(full or self.fileBarDirty):
+			rects.append(self.drawFileBar())
+		if(full):
+			return None
+		return rects
+
+	def fileBarButtons(self):
+		# Areas of the sort button and letter groups along the bar
+		sortWidth = 48
+		groupWidth = (self.settings.Width-sortWidth)//len(self.fileGroups)
+		top = self.fileBarRect.y+2
+		height = self.fileBarHeight-4
+		buttons = [(pygame.Rect(2, top, sortWidth-4, height), -1)]
+		for g in range(len(self.fileGroups)):
+			buttons.append((pygame.Rect(sortWidth+g*groupWidth, top, groupWidth-2, height), g))
+		return buttons
+
+	def drawFileBar(self):
+		# Draw the sort button and letter groups, the chosen group highlighted
+		self.screen.fill(self.background, self.fileBarRect)
+		for rect, g in self.fileBarButtons():
+			if(g<0):
+				label = self.fileSorts[self.fileSort][1]
+			else:
+				label = self.fileGroups[g][0]
+				if(g==self.fileGroup):
+					self.screen.fill(self.butHighlight, rect)
+			pygame.draw.rect(self.screen, self.butBorder, rect, 1)
+			text = renderText(statusFont, label, 1, self.butText)
+			self.screen.blit(text, text.get_rect(center=rect.center))
+		self.fileBarDirty = False
+		return self.fileBarRect
 
 	def handleFileman(self, event):
-		# Only handle mouse down
+		# The arrows page up and down. The list itself can be tapped, dragged
+		# and flung
 		if(event.type==pygame.MOUSEBUTTONDOWN):
+			for x in self.fileHits.find(event.pos):
+				if(x is self.upIcon or x is self.downIcon):
+					# Only while the arrow is shown
+					if(x in self.fileIconList):
+						self.piezoChirp()
+						if(x is self.downIcon):
+							self.fileView.pageDown()
+						else:
+							self.fileView.pageUp()
+						return
+				else:
+					# Change the sort order or letter filter
+					self.piezoChirp()
+					if(x<0):
+						self.fileSort = (self.fileSort+1)%len(self.fileSorts)
+					else:
+						self.fileGroup = x
+					self.applyFileView()
+			if(self.fileBarRect.collidepoint(event.pos)):
+				return
+
+		tap = self.fileView.handleEvent(event)
+		if(tap is not None):
 			#Ignore clicks if insufficient time has passed since last one
 			timeNow=pygame.time.get_ticks()
 			if(timeNow>self.nextClick):
 				# Reset the click timer
-				self.nextClick=timeNow+self.click_delay
-				clicked=False
-				for x in self.fileIconList:
-					if(x.isClicked(event)):
-						clicked=True
-						break
-				if(clicked):
-					# Something was clicked. Beep and act on it
-					self.piezoChirp()
-					# What was clicked
-					if(x.type=='file'):
-						self.selectFile(x.name)
-					if(x.type=='del'):
-						self.deleteFile(x.name)
-					if(x.type=='img'):
-						# Hit another icon - an arrow
-						if(x.name=='down_icon'):
-							self.fileStart=self.fileStart+1
-							self.refreshFileList()
-						if(x.name=='up_icon'):
-							self.fileStart=self.fileStart-1
-							self.refreshFileList()
-
-	def refreshFileList(self):
-		# Sets a list of files on the printer ordered by most recent
-		# Also constructs list of icons to display.
-		rawdata=self.getAPIrequest(self.urls['filelist'])
-		# Print nicely for testing
-		fulldata=rawdata.json()["files"]
-		self.filemanList = []
-		unsorted = []
-		for f in fulldata:
-			unsorted.append({"filename": f["path"], "date": f["date"]})
-		self.filemanList = sorted(unsorted, key=lambda k: k['date'], reverse=True)
-
-		# Create icon list
-		numFiles=len(self.filemanList)
-		upArrow = False
-		downArrow = False
-
-		if(numFiles-self.fileStart <= self.totalFiles):
-			fileEnd=numFiles
+				self.nextClick=timeNow+self.settings.click_delay
+				# Something was clicked. Beep and act on it
+				self.piezoChirp()
+				index, x = tap
+				f = self.fileFolder[index]
+				n = f["filename"]
+				# What was clicked, the delete icon is at the end of the row
+				if(f["type"] in ("folder", "up")):
+					self.openFolder(n)
+				elif(x>=self.fileView.rect.w-30):
+					self.deleteFile(n)
+				else:
+					self.selectFile(n)
+
+	def openFolder(self, path):
+		# Show a folder in the file manager, "" for the top. What we already
+		# have of it is shown straight away while it is brought up to date
+		print("Opening folder", path)
+		self.fileFolder = self.fileTree.folder(path)
+		self.fileView.items = self.fileFolder
+		self.applyFileView()
+		self.fetchFolder(self.fileFolder)
+
+	def fetchFolder(self, folder):
+		# Download a folder on a command worker, so a slow OctoPrint does not
+		# hold up the screen. It is shown if it has changed
+		def run(timeout):
+			fetched = folder.fetch(timeout)
+			if(fetched is not None):
+				self.fileUpdate(lambda: self.useFolder(folder, fetched))
+			return True
+		self.commands.submit(run, self.settings.commandTimeout, 'files', 'folder:'+folder.path)
+
+	def fileUpdate(self, func):
+		# Called from a command worker, run func on this thread to change the
+		# file list
+		self.fileUpdates.append(func)
+		pygame.event.post(pygame.event.Event(FILESEVENT))
+
+	def useFolder(self, folder, fetched):
+		# Show a folder downloaded in the background
+		folder.use(fetched)
+		if(folder is self.fileFolder):
+			# Keep the place in the list
+			self.fileView.reset()
+			self.fileBarDirty = True
+
+	def applyFileView(self):
+		# Show the current folder in the chosen sort order and letter group
+		self.fileFolder.setView(self.fileSorts[self.fileSort][0], self.fileGroups[self.fileGroup][1])
+		self.fileView.reset()
+		self.fileView.scrollTo(0)
+		self.fileBarDirty = True
+
+	def drawFileRow(self, surface, f):
+		# Draw one row of the file list, the name and a delete icon for files
+		if(f["type"]=="up"):
+			n = ".. (up a folder)"
+		elif(f["type"]=="folder"):
+			n = f["name"]+"/"
 		else:
-			fileEnd=self.fileStart+self.totalFiles
-			downArrow = True
+			n = f["name"]
+		surface.blit(renderText(statusFont, n[:self.fileNameLength], 1, self.fileListColour), (0,0))
+		if(f["type"] not in ("folder", "up")):
+			surface.blit(self.deleteImg, (surface.get_width()-30, 0))
 
-		if(self.fileStart>0):
-			upArrow = True
+	def refreshFileList(self):
+		# Constructs list of arrow icons to display, depending on whether the
+		# file list can scroll up or down
+		upArrow, downArrow = self.fileView.canScroll()
 
-		# Make a list of the file manager icons with properties then render from this
-		# it aids the click detection
 		self.fileIconList = []
-
-		for x in range(self.fileStart,fileEnd):
-			n = self.filemanList[x]["filename"]
-			# Set height of icons
-			h = 10+(x-self.fileStart)*18
-			i = self.fileManIcon('file', n, (25,h))
-			fileLine = statusFont.render(n[:self.fileNameLength], 1, self.fileListColour)
-			i.setImage(fileLine)
-			self.fileIconList.append(i)
-			# Delete icon
-			d = self.fileManIcon('del', n, (self.Width-30, h))
-			d.setImage(self.deleteImg)
-			self.fileIconList.append(d)
-
 		if(upArrow):
-			i = self.fileManIcon('img', 'up_icon', (5,8))
-			i.setImage(self.upArrowImg)
-			self.fileIconList.append(i)
+			self.fileIconList.append(self.upIcon)
 		if(downArrow):
-			i = self.fileManIcon('img', 'down_icon', (5,self.Height-23))
-			i.setImage(self.downArrowImg)
-			self.fileIconList.append(i)
+			self.fileIconList.append(self.downIcon)
 	# End of refreshFileList
 
 	def deleteFile(self,f):
+		# Deleted on a command worker, after what is already queued
 		print("Deleting file ", f)
-		response=self.deleteAPIrequest(self.urls['delete']+f)
-		self.refreshFileList()
+		self.queueCommand(self.sendDelete, (self.fileFolder, f), self.settings.commandTimeout, 'printer', 'delete:'+f)
+
+	def sendDelete(self, arg, timeout=None):
+		folder, f = arg
+		response=self.deleteAPIrequest(self.urls['delete']+f, timeout)
+		if(response is not None and response.status_code in (204, 404)):
+			# Gone, take it out of the list we have rather than fetching it again
+			self.fileUpdate(lambda: self.removeFile(folder, f))
+			return True
+		return False
+
+	def removeFile(self, folder, f):
+		folder.remove(f)
+		if(folder is self.fileFolder):
+			self.fileView.reset()
 
 	def selectFile(self, f):
 		print("Selecting file ", f)
-		response=self.postAPIrequest(self.urls['delete']+f, '{"command": "select"}')
+		self.queueCommand(self.sendSelect, f, self.settings.commandTimeout, 'printer', 'select:'+f)
 		# Drop out of file manager mode
 		self.fileManMode = False
 
+	def sendSelect(self, f, timeout=None):
+		return responseOK(self.postAPIrequest(self.urls['delete']+f, '{"command": "select"}', timeout))
+
 # End of OctoMiniScreen Class
 
 
 
 if __name__ == '__main__':
-	oms = OctoMiniScreen("OctoMiniScreen");
+	configStart = time.time()
+	try:
+		config = loadConfig(OctoMiniScreen.configFile)
+	except configError as e:
+		print "Config error: " + str(e)
+		raise SystemExit(1)
+	print "Config read in {0:.1f}ms".format((time.time()-configStart)*1000)
+	oms = OctoMiniScreen(config, "OctoMiniScreen");
 	oms.Start()
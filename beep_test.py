@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+# Piezo beep test
+#
+# Plays beeps through piezo into a stubBuzzer, so it runs without a buzzer.
+# Checks play() returns straight away, that each pattern gives the pulses
+# expected and that beeps asked for while one is playing are merged into the
+# most important one.
+
+import time
+from piezo import piezo, stubBuzzer
+
+PIN = 36
+
+stub = stubBuzzer()
+buzzer = piezo(stub, PIN, 0.01)
+
+slowest = [0]
+def play(name):
+	started = time.time()
+	buzzer.play(name)
+	slowest[0] = max(slowest[0], time.time()-started)
+
+def pulses(since):
+	# Lengths of the buzzer pulses started after since
+	found = []
+	on = None
+	for t, pin, value in stub.outputs:
+		if(t<since or pin!=PIN):
+			continue
+		if(value):
+			on = t
+		elif(on is not None):
+			found.append(t-on)
+			on = None
+	return found
+
+def near(got, expected):
+	return len(got)==len(expected) and all(abs(g-e)<0.03 for g, e in zip(got, expected))
+
+cases = []
+
+started = time.time()
+play('ack')
+time.sleep(0.2)
+cases.append(("ack", pulses(started), [0.01]))
+
+started = time.time()
+play('error')
+time.sleep(0.4)
+cases.append(("error", pulses(started), [0.05, 0.05]))
+
+# While finished plays, an ack then an error then another ack are asked for.
+# Only the error should follow it
+started = time.time()
+play('finished')
+time.sleep(0.1)
+play('ack')
+play('error')
+play('ack')
+time.sleep(1.0)
+cases.append(("merged while playing", pulses(started), [0.6, 0.05, 0.05]))
+
+ok = True
+for name, got, expected in cases:
+	match = near(got, expected)
+	ok = ok and match
+	print("{0:22s} expected {1:22s} got {2:22s} {3}".format(name, " ".join("%.2f" % p for p in expected),
+		" ".join("%.2f" % p for p in got), "" if match else "WRONG"))
+print("Longest play() call {0:.1f}ms".format(slowest[0]*1000))
+ok = ok and slowest[0]<0.005
+print("Passed" if ok else "FAILED")
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+# Circuit breaker test
+#
+# First drives a circuitBreaker directly with short delays and checks it
+# opens after threshold failures in a row, doubles its delay up to maxDelay,
+# lets exactly one probe through when half open and closes again when a
+# probe works.
+#
+# Then runs a stand-in OctoPrint on localhost which only answers
+# /api/version, and polls it through octoClient and its breaker while the
+# server is killed and restarted. While it is down only the threshold
+# failures and the probes should reach the network, and polling should be
+# back to normal soon after the server is.
+
+import threading
+import time
+try:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+import requests
+from octoClient import octoClient, circuitOpen
+from circuitBreaker import circuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+PORT = 5099
+URL = "http://127.0.0.1:{0}/api/version".format(PORT)
+
+class standIn(BaseHTTPRequestHandler):
+	def do_GET(self):
+		body = b'{"api": "0.1", "server": "stand-in"}'
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+def startServer():
+	server = HTTPServer(("127.0.0.1", PORT), standIn)
+	t = threading.Thread(target=server.serve_forever)
+	t.daemon = True
+	t.start()
+	return server
+
+def stopServer(server):
+	server.shutdown()
+	server.server_close()
+
+ok = [True]
+def check(what, passed):
+	print("  {0:50s} {1}".format(what, "ok" if passed else "WRONG"))
+	ok[0] = ok[0] and passed
+
+print("Breaker on its own")
+b = circuitBreaker(threshold=3, delay=0.1, maxDelay=0.4, name="Stand-in")
+for i in range(2):
+	b.record(False)
+check("closed after 2 failures", b.state==CLOSED and b.allow())
+b.record(False)
+check("open after 3 failures", b.state==OPEN and not b.allow())
+for n, delay in enumerate((0.1, 0.2, 0.4, 0.4)):
+	wait = b.retryIn()
+	check("open for {0:.1f}s".format(delay), abs(wait-delay)<0.05)
+	time.sleep(wait+0.02)
+	probe, second = b.allow(), b.allow()
+	check("half open, one probe allowed", b.state==HALF_OPEN and probe and not second)
+	b.record(n==3)
+check("closed after a probe works", b.state==CLOSED and b.allow() and b.allow())
+for i in range(3):
+	b.record(False)
+check("first delay again after closing", b.state==OPEN and abs(b.retryIn()-0.1)<0.05)
+
+THRESHOLD = 3
+MAXDELAY = 8.0
+breaker = circuitBreaker(threshold=THRESHOLD, delay=1.0, maxDelay=MAXDELAY)
+client = octoClient({}, connectTimeout=0.5, readTimeout=1.0, retries=0, breaker=breaker)
+
+def poll(seconds):
+	# Poll twice a second, as a fast status refresh would
+	end = time.time()+seconds
+	while time.time()<end:
+		started = time.time()
+		try:
+			r = client.get(URL)
+			result = "OK " + str(r.status_code)
+		except circuitOpen as e:
+			result = "skipped: " + str(e.strerror)
+		except requests.exceptions.RequestException as e:
+			result = "failed: " + type(e).__name__
+		print("{0:6.2f}s {1:.3f}s {2}".format(time.time()-begin, time.time()-started, result))
+		results.append((time.time(), result))
+		time.sleep(0.5)
+
+def between(start, end):
+	return [r for t, r in results if start<=t<end]
+
+results = []
+begin = time.time()
+print("Server up")
+server = startServer()
+poll(2)
+print("Server killed")
+killed = time.time()
+stopServer(server)
+poll(12)
+print("Server restarted")
+restarted = time.time()
+server = startServer()
+poll(10)
+stopServer(server)
+print("{0} requests made, {1} connections".format(*client.stats()))
+
+# While down the breaker opens for 1, 2, 4 then 8s, a probe after each
+down = between(killed, restarted)
+failed = [r for r in down if r.startswith("failed")]
+firstSkip = [i for i, r in enumerate(down) if r.startswith("skipped")][:1]
+check("all OK while the server is up", all(r.startswith("OK") for r in between(begin, killed)))
+check("{0} failures before the breaker opens".format(THRESHOLD), firstSkip==[THRESHOLD])
+check("only probes reach the server while it is down", len(failed)<=THRESHOLD+4)
+back = [t for t, r in results if t>=restarted and r.startswith("OK")]
+check("OK again within {0:.0f}s of the restart".format(MAXDELAY), len(back)>0 and back[0]-restarted<=MAXDELAY+0.5)
+check("closed at the end", breaker.state==CLOSED and results[-1][1].startswith("OK"))
+print("Passed" if ok[0] else "FAILED")
@@ -0,0 +1,79 @@
+# buttonModel
+#
+# The buttons while the screen is running. The config of each button, read by
+# octoConfig, never changes; a button holds what does, which for a toggle is
+# its current label and command. The format, type and visibility are small
+# integers rather than strings, so nothing is compared as text on a click.
+#
+# Which buttons show in each printer state is worked out once, when the
+# buttons are made, rather than on every state change.
+
+from printerState import ERROR, OFFLINE, NO_PRINTER, PRINTING
+
+# Button formats
+SOFT=0		# On screen
+HARD=1		# GPIO
+
+# Button types
+STATIC=0
+TOGGLE=1
+types={'static': STATIC, 'toggle': TOGGLE}
+
+# Visibility
+ALWAYS=0		# a, always show
+NOT_PRINTING=1		# p, hide when printing
+NEED_OCTOPRINT=2	# o, hide when octoprint not running
+visibilities={'a': ALWAYS, 'p': NOT_PRINTING, 'o': NEED_OCTOPRINT}
+
+# Whether each visibility is shown, by printer state. Octoprint errors and
+# no printer only show a buttons, printing hides p buttons. All buttons show
+# when paused and in every other state
+shownIn={ERROR: (True, False, False),
+	OFFLINE: (True, False, False),
+	NO_PRINTER: (True, False, False),
+	PRINTING: (True, False, True)}
+shownOtherwise=(True, True, True)
+
+class button(object):
+	__slots__=('config', 'format', 'type', 'label', 'labels', 'currentState',
+		'command', 'commands', 'visible', 'pin', 'buttonObj', 'nextClick')
+
+	def __init__(self, config, format):
+		# config is an octoConfig.softButton for SOFT, gpioButton for HARD
+		self.config=config
+		self.format=format
+		self.type=config.type
+		self.currentState=0
+		# Copied out of the config, which is slower to read from
+		self.commands=config.commands
+		self.command=self.commands[0]
+		self.buttonObj=None		# The miniScButton, for soft buttons
+		self.nextClick=0		# Ticks before which clicks are ignored
+		if(format==SOFT):
+			self.labels=config.labels
+			self.label=self.labels[0]
+			self.visible=config.visible
+			self.pin=None
+		else:
+			self.labels=None
+			self.label=config.label
+			self.visible=ALWAYS
+			self.pin=config.pin
+
+	def toggle(self):
+		# Move a toggle on to its next label and command
+		self.currentState+=1
+		if(self.currentState==len(self.commands)):
+			self.currentState=0
+		self.command=self.commands[self.currentState]
+		if(self.format==SOFT):
+			self.label=self.labels[self.currentState]
+			self.buttonObj.text=self.label
+
+def visibilityTable(buttons):
+	# (miniScButton, active) for each button, by printer state. States not
+	# in the table are under None. Make once the buttons have been laid out
+	table={}
+	for state, shown in list(shownIn.items())+[(None, shownOtherwise)]:
+		table[state]=tuple((b.buttonObj, 1 if shown[b.visible] else 0) for b in buttons)
+	return table
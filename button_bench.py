@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+# Time the per-event button work: finding the GPIO button for a pin and
+# toggling it, and updating which buttons show on a printer state change.
+# The dict buttons, as they were before buttonModel, are timed against the
+# button objects and the precomputed visibility table.
+
+import timeit
+from octoConfig import loadConfig
+from buttonModel import button, visibilityTable, SOFT, HARD, TOGGLE
+
+class stubButton(object):
+	# Stands in for miniScButton, which needs pygame
+	def __init__(self, text):
+		self.text=text
+		self.active=1
+
+config = loadConfig("octominiscreen.cfg")
+names = {0: 'static', 1: 'toggle'}
+letters = {0: 'a', 1: 'p', 2: 'o'}
+
+# The old dict buttons
+oldButtons = []
+for c in config.buttons:
+	oldButtons.append({'format': "soft", 'type': names[c.type], 'label': c.labels[0],
+		'toggleOpts': list(c.labels), 'currentState': 0, 'command': c.commands[0].text,
+		'toggleCmds': [cmd.text for cmd in c.commands], 'toggleParsed': [(cmd.kind, cmd.arg) for cmd in c.commands],
+		'parsed': (c.commands[0].kind, c.commands[0].arg), 'visible': letters[c.visible], 'buttonObj': stubButton(c.labels[0])})
+oldGPIO = [{'format': "hard", 'type': names[c.type], 'label': c.label, 'pin': c.pin,
+	'currentState': 0, 'toggleCmds': [cmd.text for cmd in c.commands],
+	'toggleParsed': [(cmd.kind, cmd.arg) for cmd in c.commands], 'command': c.commands[0].text, 'parsed': (c.commands[0].kind, c.commands[0].arg)}
+	for c in config.gpioButtons]
+
+def oldClick(cButton):
+	kind, arg = cButton['parsed']
+	if(cButton['type']=="toggle"):
+		l=len(cButton['toggleCmds'])
+		cButton['currentState']+=1
+		if(cButton['currentState']==l):
+			cButton['currentState']=0
+		if(cButton['format']=="soft"):
+			cButton['label']=cButton['toggleOpts'][cButton['currentState']]
+			cButton['buttonObj'].text=cButton['label']
+		cButton['command']=cButton['toggleCmds'][cButton['currentState']]
+		cButton['parsed']=cButton['toggleParsed'][cButton['currentState']]
+	return kind
+
+def oldGPIOEvent(pin):
+	for b in oldGPIO:
+		if(b['pin']==pin):
+			oldClick(b)
+
+def oldVisibility(state):
+	for b in oldButtons:
+		if((state>=1 and state<=3) and (b['visible']=='o' or b['visible']=='p')):
+			b['buttonObj'].active=0
+		elif(state==4 and b['visible']=='p'):
+			b['buttonObj'].active=0
+		elif(state==5 and (b['visible']=='o' or b['visible']=='p')):
+			b['buttonObj'].active=1
+		else:
+			b['buttonObj'].active=1
+
+# The new button objects
+newButtons = [button(c, SOFT) for c in config.buttons]
+for b in newButtons:
+	b.buttonObj = stubButton(b.label)
+newGPIO = [button(c, HARD) for c in config.gpioButtons]
+byPin = dict((b.pin, b) for b in newGPIO)
+table = visibilityTable(newButtons)
+
+def newClick(cButton):
+	eCmd, kind, arg = cButton.command
+	if(cButton.type==TOGGLE):
+		cButton.toggle()
+	return kind
+
+def newGPIOEvent(pin):
+	b = byPin.get(pin)
+	if(b is not None):
+		newClick(b)
+
+def newVisibility(state):
+	for buttonObj, active in table.get(state, table[None]):
+		buttonObj.active=active
+
+runs = 100000
+pins = [c.pin for c in config.gpioButtons]
+toggle = [b for b in oldButtons if b['type']=="toggle"][0]
+toggleNew = [b for b in newButtons if b.type==TOGGLE][0]
+for name, old, new in (
+		("Soft toggle click", lambda: oldClick(toggle), lambda: newClick(toggleNew)),
+		("GPIO event", lambda: oldGPIOEvent(pins[-1]), lambda: newGPIOEvent(pins[-1])),
+		("State change", lambda: oldVisibility(4), lambda: newVisibility(4))):
+	tOld = min(timeit.repeat(old, number=runs, repeat=5))
+	tNew = min(timeit.repeat(new, number=runs, repeat=5))
+	print("{0:18s} {1:6.2f} us before, {2:6.2f} us after".format(name, tOld*1000000/runs, tNew*1000000/runs))
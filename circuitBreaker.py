@@ -0,0 +1,80 @@
+# circuitBreaker
+#
+# Stops calling OctoPrint for a while once it can not be reached, rather
+# than every status refresh, command and screen saver source waiting for the
+# connect timeout in turn. After threshold failures in a row the breaker
+# opens and calls fail straight away. Once the delay is up it is half open
+# and lets a single call through as a probe: if that works everything goes
+# back to normal, if not it opens again for twice as long, up to maxDelay.
+
+import threading
+try:
+	from time import monotonic
+except ImportError:
+	# Python 2 has no monotonic clock, wall clock time will do
+	from time import time as monotonic
+
+# Breaker states
+CLOSED=0	# Calling normally
+OPEN=1		# Not calling until the delay is up
+HALF_OPEN=2	# One probe call allowed
+
+class circuitBreaker(object):
+	def __init__(self, threshold=3, delay=3.0, maxDelay=60.0, name="OctoPrint"):
+		# Delays are in seconds
+		self.threshold=threshold
+		self.delay=delay
+		self.maxDelay=maxDelay
+		self.name=name
+		self.state=CLOSED
+		self.failures=0		# In a row while closed
+		self.trips=0		# Times opened without a call working since
+		self.openUntil=0
+		self.probing=False
+		self.lock=threading.Lock()
+
+	def allow(self):
+		# Can a call be made now? Half open only allows the first caller
+		with self.lock:
+			if(self.state==OPEN and monotonic()>=self.openUntil):
+				self.state=HALF_OPEN
+			if(self.state==HALF_OPEN):
+				if(self.probing):
+					return False
+				self.probing=True
+				return True
+			return self.state==CLOSED
+
+	def record(self, ok):
+		# The outcome of a call allow() let through
+		with self.lock:
+			if(ok):
+				if(self.state!=CLOSED):
+					print(self.name + " reachable again")
+				self.state=CLOSED
+				self.failures=0
+				self.trips=0
+				self.probing=False
+			elif(self.state==HALF_OPEN):
+				self.probing=False
+				self.trip()
+			elif(self.state==CLOSED):
+				self.failures+=1
+				if(self.failures>=self.threshold):
+					self.trip()
+
+	def trip(self):
+		# Open for longer each time in a row, call with the lock held
+		wait=min(self.maxDelay, self.delay*(2**min(self.trips, 16)))
+		self.trips+=1
+		self.failures=0
+		self.state=OPEN
+		self.openUntil=monotonic()+wait
+		print("{0} unreachable, trying again in {1:.0f}s".format(self.name, wait))
+
+	def retryIn(self):
+		# Seconds until a probe will be allowed while open, otherwise None
+		with self.lock:
+			if(self.state!=OPEN):
+				return None
+			return max(0, self.openUntil-monotonic())
@@ -0,0 +1,106 @@
+# commandQueue
+#
+# Runs button commands on a small pool of worker threads, so the screen never
+# waits for the printer or a slow URL. Commands for the same target run one
+# at a time in the order they were queued, so GCODE reaches the printer in
+# the order the buttons were pressed, while commands without a target, such
+# as plain URL calls, run alongside each other.
+#
+# A command which is already waiting is not queued again when its button is
+# pressed twice, and only so many can wait, so a stuck printer can not build
+# up a backlog of presses. notify is called whenever the number waiting or
+# failed changes, for the on screen indicator.
+
+import collections
+import threading
+
+# What submit did with a command
+QUEUED=0
+WAITING=1	# The same command is already waiting, so not queued again
+FULL=2		# Too many waiting, not queued
+
+class commandQueue(object):
+	def __init__(self, workers=2, maxPending=8, notify=None):
+		self.notify=notify
+		self.maxPending=maxPending
+		self.pending=collections.deque()	# (target, key, func, timeout)
+		self.busy=set()		# Targets with a command running
+		self.running=0
+		self.failed=0		# Failures since a command was last queued
+		self.stopped=False
+		self.cond=threading.Condition()
+		self.threads=[]
+		for i in range(workers):
+			t=threading.Thread(target=self.run, name="commandWorker"+str(i))
+			t.daemon=True
+			self.threads.append(t)
+
+	def start(self):
+		for t in self.threads:
+			t.start()
+
+	def stop(self):
+		with self.cond:
+			self.stopped=True
+			self.cond.notify_all()
+
+	def submit(self, func, timeout=None, target=None, key=None):
+		# Queue func(timeout) to run, it returns True if it worked. Returns
+		# QUEUED, WAITING if a command with the same key is waiting or FULL
+		with self.cond:
+			if(key is not None and any(c[1]==key for c in self.pending)):
+				print("Command already waiting: " + str(key))
+				return WAITING
+			if(len(self.pending)>=self.maxPending):
+				print("Command queue full, not queued: " + str(key))
+				return FULL
+			self.pending.append((target, key, func, timeout))
+			self.failed=0
+			self.cond.notify()
+		self.changed()
+		return QUEUED
+
+	def state(self):
+		# Returns the number of commands waiting or running, and failures
+		with self.cond:
+			return len(self.pending)+self.running, self.failed
+
+	def next(self):
+		# The oldest command whose target is not already busy
+		for c in self.pending:
+			if(c[0] is None or c[0] not in self.busy):
+				self.pending.remove(c)
+				return c
+		return None
+
+	def run(self):
+		while True:
+			with self.cond:
+				c=self.next()
+				while(c is None and not self.stopped):
+					self.cond.wait()
+					c=self.next()
+				if(self.stopped):
+					return
+				self.running+=1
+				if(c[0] is not None):
+					self.busy.add(c[0])
+
+			try:
+				ok=c[2](c[3])
+			except Exception as e:
+				print("Command failed: " + str(e))
+				ok=False
+
+			with self.cond:
+				self.running-=1
+				self.busy.discard(c[0])
+				if(not ok):
+					self.failed+=1
+				# A command waiting for this target can now run
+				self.cond.notify_all()
+			self.changed()
+
+	def changed(self):
+		if(self.notify is not None):
+			self.notify()
@@ -0,0 +1,121 @@
+# dashboard
+#
+# Live print details in place of the buttons: hotend and bed temperatures
+# against their targets, time printed and left, when it should finish, Z
+# height and a progress bar. Each field is a widget which remembers what it
+# last showed, so a new status only repaints the fields whose text has
+# changed, and the bar only when it has grown by a pixel.
+
+import time
+import pygame
+from textCache import renderText
+from printerState import noDetails
+
+def temperature(actual, target):
+	if(actual is None):
+		return "-"
+	if(target):
+		return u"{0}/{1}\u00b0".format(actual, target)
+	return u"{0}\u00b0".format(actual)
+
+def duration(seconds):
+	if(seconds is None):
+		return "-"
+	seconds=int(seconds)
+	return "{0}:{1:02d}:{2:02d}".format(seconds//3600, seconds//60%60, seconds%60)
+
+def finishTime(left, now):
+	# Clock time a print with left seconds to go will finish
+	if(left is None):
+		return "-"
+	return time.strftime("%H:%M", time.localtime(now+left))
+
+class field(object):
+	def __init__(self, rect, label, labelFont, valueFont, labelColour, valueColour):
+		# A label, which may be empty, with the value shown below it
+		self.rect=pygame.Rect(rect)
+		self.label=label
+		self.labelFont=labelFont
+		self.valueFont=valueFont
+		self.labelColour=labelColour
+		self.valueColour=valueColour
+		self.valueRect=pygame.Rect(self.rect)
+		if(label):
+			self.valueRect.top+=labelFont.get_linesize()
+			self.valueRect.height-=labelFont.get_linesize()
+		self.last=None
+
+	def draw(self, screen, background, text, full):
+		# Returns the area drawn, None if nothing has changed
+		if(full):
+			screen.fill(background, self.rect)
+			if(self.label):
+				screen.blit(renderText(self.labelFont, self.label, 1, self.labelColour), self.rect.topleft)
+		elif(text==self.last):
+			return None
+		else:
+			screen.fill(background, self.valueRect)
+		self.last=text
+		value=renderText(self.valueFont, text, 1, self.valueColour)
+		# Cut off anything too long for the field
+		screen.blit(value, self.valueRect.topleft, pygame.Rect(0, 0, self.valueRect.w, self.valueRect.h))
+		return self.rect if full else self.valueRect
+
+class progressBar(object):
+	def __init__(self, rect, border, colour):
+		self.rect=pygame.Rect(rect)
+		self.border=border
+		self.colour=colour
+		self.last=None
+
+	def draw(self, screen, background, fraction, full):
+		# fraction is how much is done, 0 to 1
+		inside=self.rect.inflate(-4, -4)
+		width=int(inside.w*min(1, max(0, fraction)))
+		if(not full and width==self.last):
+			return None
+		self.last=width
+		screen.fill(background, self.rect)
+		pygame.draw.rect(screen, self.border, self.rect, 1)
+		screen.fill(self.colour, (inside.left, inside.top, width, inside.h))
+		return self.rect
+
+class dashboard(object):
+	def __init__(self, rect, smallFont, bigFont, labelColour, valueColour, barColour, padding=6):
+		rect=pygame.Rect(rect)
+		small=smallFont.get_linesize()
+		left=rect.left+padding
+		width=rect.w-2*padding
+		half=(width-padding)//2
+
+		# File name and percent done along the top, progress bar at the bottom
+		self.file=field((left, rect.top+padding, width-50, small), "", smallFont, smallFont, labelColour, valueColour)
+		self.percent=field((rect.right-padding-45, rect.top+padding, 45, small), "", smallFont, smallFont, labelColour, valueColour)
+		self.bar=progressBar((left, rect.bottom-padding-18, width, 18), labelColour, barColour)
+
+		# The rest in two columns between them
+		top=rect.top+2*padding+small
+		rowHeight=(self.bar.rect.top-padding-top)//3
+		self.fields=[]
+		for i, label in enumerate(("Hotend", "Bed", "Printed", "Left", "Finish", "Z")):
+			x=left+(i%2)*(half+padding)
+			y=top+(i//2)*rowHeight
+			self.fields.append(field((x, y, half, rowHeight), label, smallFont, bigFont, labelColour, valueColour))
+
+	def draw(self, screen, background, details, full, now=None):
+		# Draw the details, a printDetails or None. Returns the areas changed
+		d=details or noDetails
+		if(now is None):
+			now=time.time()
+		texts=(temperature(d.hotend, d.hotendTarget),
+			temperature(d.bed, d.bedTarget),
+			duration(d.elapsed),
+			duration(d.left),
+			finishTime(d.left, now),
+			"-" if d.z is None else "{0:.2f}mm".format(d.z))
+		rects=[self.file.draw(screen, background, d.file or "No file loaded", full),
+			self.percent.draw(screen, background, "-" if d.completion is None else "{0:.0f}%".format(d.completion), full),
+			self.bar.draw(screen, background, (d.completion or 0)/100.0, full)]
+		for f, text in zip(self.fields, texts):
+			rects.append(f.draw(screen, background, text, full))
+		return [r for r in rects if r is not None]
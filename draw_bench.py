@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+# Time miniScButton.draw() per button, for active, highlighted and disabled
+# buttons. Runs without a screen using SDL's dummy video driver.
+
+import os
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import timeit
+import pygame
+from miniScButton import miniScButton
+
+pygame.init()
+screen = pygame.display.set_mode((320, 240))
+background = (0,0,64)
+
+button = miniScButton(6, 6, 100, 60, "Home all", (160,215,0), (100,200,200), (40,80,160), 1)
+runs = 10000
+
+for name, highlight, active in (("active", 0, 1), ("highlighted", 1, 1), ("disabled", 0, 0)):
+	button.highlight = highlight
+	button.active = active
+	t = timeit.timeit(lambda: button.draw(screen, background), number=runs)
+	print("{0:12s} {1:8.1f} us per draw".format(name, t*1000000/runs))
@@ -0,0 +1,210 @@
+# fileList
+#
+# The files on OctoPrint, kept in memory for the file manager. Each folder is
+# a separate fileList, only fetched when it is first opened, so memory grows
+# with the folders visited rather than the files stored. A folder is only
+# downloaded again when OctoPrint says it has changed, using the ETag and
+# Last-Modified headers from the last download, or when it has been
+# invalidated by a change notification. Deleted files are removed from the
+# list rather than downloading it again.
+#
+# Downloading is split from showing, so fetch can run on a worker thread
+# without changing the list the screen is drawing, and use then shows what
+# it fetched on the screen's thread.
+#
+# The files in a folder are put in a fileIndex when downloaded, which holds
+# them in every sort order and grouped by first letter, so changing the sort
+# or filtering by letter needs no sorting or searching.
+#
+# Entries are dicts of
+#  filename    Path from the top folder, used in API calls
+#  name        Name within its folder
+#  lname       Lower case name, for sorting
+#  letter      Upper case first letter, '#' if not a letter
+#  date        Upload time, 0 for folders
+#  size        Size in bytes
+#  time        Estimated print time in seconds, None if not analysed
+#  last        Time last printed, 0 if never
+#  type        'folder', 'up' for the entry leading to the parent folder, or
+#              OctoPrint's file type
+
+import requests
+
+def makeEntry(f):
+	# Entry from a file or folder in an /api/files response
+	name=f["name"]
+	letter=name[:1].upper()
+	if(not letter.isalpha()):
+		letter="#"
+	analysis=f.get("gcodeAnalysis") or {}
+	prints=f.get("prints") or {}
+	last=prints.get("last") or {}
+	return {"filename": f["path"], "name": name, "lname": name.lower(), "letter": letter,
+		"date": f.get("date") or 0, "size": f.get("size") or 0,
+		"time": analysis.get("estimatedPrintTime"), "last": last.get("date") or 0,
+		"type": f.get("type")}
+
+class fileIndex(object):
+	# One folder's files in each sort order, and by first letter
+	modes=('date', 'name', 'size', 'time', 'last')
+	keys={'date': lambda f: -f['date'],		# Newest first
+		'name': lambda f: f['lname'],
+		'size': lambda f: -f['size'],		# Biggest first
+		'time': lambda f: (f['time'] is None, f['time']),	# Quickest first
+		'last': lambda f: -f['last']}		# Most recently printed first
+
+	def __init__(self, files, groups=()):
+		# groups are strings of letters which will be selected together,
+		# single letters are always grouped
+		self.groups=groups
+		inGroups={}
+		for g in groups:
+			for l in g:
+				inGroups.setdefault(l, []).append(g)
+		self.orders={}
+		self.byLetter={}
+		for mode in self.modes:
+			order=sorted(files, key=self.keys[mode])
+			self.orders[mode]=order
+			letters={}
+			for f in order:
+				letters.setdefault(f['letter'], []).append(f)
+				for g in inGroups.get(f['letter'], ()):
+					if(g!=f['letter']):
+						letters.setdefault(g, []).append(f)
+			self.byLetter[mode]=letters
+
+	def select(self, mode, letters=None):
+		# Files in a sort order, only those starting with one of letters if given
+		if(not letters):
+			return self.orders[mode]
+		if(len(letters)==1 or letters in self.groups):
+			return self.byLetter[mode].get(letters, [])
+		found=[]
+		for l in letters:
+			found.extend(self.byLetter[mode].get(l, []))
+		return sorted(found, key=self.keys[mode])
+
+class fileList(object):
+	def __init__(self, client, url, path="", groups=()):
+		# client is the octoClient, url lists just this folder. path is the
+		# folder from the top, "" for the top itself. groups are the letter
+		# groups to index, see fileIndex
+		self.client=client
+		self.url=url
+		self.path=path
+		self.groups=groups
+		self.files=[]		# Folders first, then files in the chosen order
+		self.head=[]		# The up entry and folders
+		self.index=fileIndex([])
+		self.sortMode='date'
+		self.letters=None
+		self.etag=None
+		self.lastModified=None
+		self.stale=True
+		self.changes=0		# Invalidations, so one during a fetch is not lost
+
+	def invalidate(self):
+		# Something has changed on OctoPrint, download it all next fetch
+		self.stale=True
+		self.changes+=1
+
+	def fetch(self, timeout=None):
+		# Download the list if it has changed, leaving the list shown alone.
+		# Returns what to pass to use, or None if unchanged or it failed
+		changes=self.changes
+		headers={}
+		if(not self.stale):
+			if(self.etag is not None):
+				headers['If-None-Match']=self.etag
+			if(self.lastModified is not None):
+				headers['If-Modified-Since']=self.lastModified
+		try:
+			r=self.client.get(self.url, headers=headers, timeout=timeout)
+		except requests.exceptions.RequestException as e:
+			print("File list request failed: " + str(e))
+			return None
+		if(r.status_code==304):
+			return None
+		if(r.status_code!=200):
+			print("File list request failed, status code = " + str(r.status_code))
+			return None
+
+		rj=r.json()
+		# The top folder lists its files, other folders their children
+		entries=rj["files"] if "files" in rj else rj.get("children", [])
+		folders=[]
+		files=[]
+		for f in entries:
+			entry=makeEntry(f)
+			if(entry["type"]=="folder"):
+				folders.append(entry)
+			else:
+				files.append(entry)
+		folders.sort(key=lambda k: k['lname'])
+		if(self.path):
+			parent=self.path.rsplit('/', 1)[0] if '/' in self.path else ""
+			folders.insert(0, {"filename": parent, "name": "..", "date": 0, "type": "up"})
+		return (folders, fileIndex(files, self.groups), r.headers.get('ETag'),
+			r.headers.get('Last-Modified'), changes)
+
+	def use(self, fetched):
+		# Show a list from fetch
+		self.head, self.index, self.etag, self.lastModified, changes=fetched
+		# Still stale if it changed again while it was fetched
+		self.stale=(changes!=self.changes)
+		self.applyView()
+
+	def setView(self, sortMode, letters=None):
+		# Choose the sort order, and only show files starting with one of
+		# letters, or all of them if None
+		self.sortMode=sortMode
+		self.letters=letters
+		self.applyView()
+
+	def applyView(self):
+		self.files=self.head+self.index.select(self.sortMode, self.letters)
+
+	def remove(self, filename):
+		# Take a deleted file out of the list
+		self.index=fileIndex([f for f in self.index.orders['date'] if f["filename"]!=filename], self.groups)
+		self.applyView()
+		# Our copy now differs from the one the ETag describes
+		self.etag=None
+		self.lastModified=None
+
+	def __len__(self):
+		return len(self.files)
+
+	def __getitem__(self, index):
+		return self.files[index]
+
+class fileTree(object):
+	# The folders visited so far, each cached and invalidated on its own
+	def __init__(self, client, url, groups=()):
+		# url is the base of folder listings, e.g. .../api/files/local
+		# groups are the letter groups to index, see fileIndex
+		self.client=client
+		self.url=url
+		self.groups=groups
+		self.folders={}
+
+	def folder(self, path=""):
+		# The fileList for a folder, not fetched until it is opened
+		node=self.folders.get(path)
+		if(node is None):
+			if(path):
+				url=self.url+"/"+requests.utils.quote(path)+"?recursive=false"
+			else:
+				url=self.url+"?recursive=false"
+			node=fileList(self.client, url, path, self.groups)
+			self.folders[path]=node
+		return node
+
+	def invalidate(self, path=None):
+		# Mark one folder, or all of them, as needing downloading again
+		if(path is None):
+			for node in self.folders.values():
+				node.invalidate()
+		elif(path in self.folders):
+			self.folders[path].invalidate()
@@ -0,0 +1,194 @@
+# gpioInput
+#
+# Hardware buttons driven by GPIO edge callbacks rather than polling. Each pin
+# is debounced in software: the first edge is acted on straight away, then
+# edges are ignored until the pin has settled, when it is read again in case
+# the button was released during the bounce. Presses are put on a thread safe
+# queue for the main loop, which is woken by the notify function.
+#
+# Events are (pin, kind) where kind is
+#  press       A normal press
+#  long        Held for longPress milliseconds. With longPress set, a normal
+#              press is only sent when released before then
+#  repeat      Held for another repeat milliseconds, sent until released.
+#              Ignored if longPress is set
+#
+# fakeGPIO stands in for RPi.GPIO on a machine without GPIO pins.
+
+import threading
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+class gpioPin(object):
+	def __init__(self, pin, bounce, longPress, repeat):
+		self.pin=pin
+		self.bounce=bounce
+		self.longPress=longPress
+		self.repeat=repeat
+		self.pressed=False
+		self.settling=False
+		self.longSent=False
+		self.settleTimer=None
+		self.holdTimer=None
+
+class gpioInput(object):
+	def __init__(self, gpio, notify=None):
+		# gpio is the RPi.GPIO module or a fakeGPIO
+		self.gpio=gpio
+		self.notify=notify
+		self.pins={}
+		self.events=queue.Queue()
+		self.lock=threading.Lock()
+
+	def add(self, pin, bounce=50, longPress=0, repeat=0):
+		# Times in milliseconds. Buttons pull the pin low when pressed
+		self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+		self.pins[pin]=gpioPin(pin, bounce, longPress, repeat)
+		self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self.edge)
+
+	def remove(self, pin):
+		p=self.pins.pop(pin, None)
+		if(p is None):
+			return
+		self.gpio.remove_event_detect(pin)
+		with self.lock:
+			self.cancel(p)
+
+	def get(self):
+		# Returns all the events waiting, oldest first
+		waiting=[]
+		while True:
+			try:
+				waiting.append(self.events.get_nowait())
+			except queue.Empty:
+				return waiting
+
+	def edge(self, pin):
+		# Called from the GPIO library thread on any edge
+		p=self.pins.get(pin)
+		if(p is None or p.settling):
+			return
+		self.sample(p)
+
+	def sample(self, p):
+		# Read the pin and act on a change, then ignore edges until it settles
+		with self.lock:
+			p.settling=False
+			pressed=(self.gpio.input(p.pin)==0)
+			if(pressed==p.pressed):
+				return
+			p.pressed=pressed
+			p.settling=True
+			p.settleTimer=self.timer(p.bounce, self.sample, p)
+			if(pressed):
+				self.pressed(p)
+			else:
+				self.released(p)
+
+	def pressed(self, p):
+		p.longSent=False
+		if(p.longPress>0):
+			p.holdTimer=self.timer(p.longPress, self.held, p)
+		else:
+			self.emit(p.pin, 'press')
+			if(p.repeat>0):
+				p.holdTimer=self.timer(p.repeat, self.held, p)
+
+	def released(self, p):
+		if(p.holdTimer is not None):
+			p.holdTimer.cancel()
+			p.holdTimer=None
+		if(p.longPress>0 and not p.longSent):
+			self.emit(p.pin, 'press')
+
+	def held(self, p):
+		# Hold timer fired, the button is still down
+		with self.lock:
+			if(not p.pressed):
+				return
+			if(p.longPress>0):
+				p.longSent=True
+				p.holdTimer=None
+				self.emit(p.pin, 'long')
+			else:
+				self.emit(p.pin, 'repeat')
+				p.holdTimer=self.timer(p.repeat, self.held, p)
+
+	def cancel(self, p):
+		for t in (p.settleTimer, p.holdTimer):
+			if(t is not None):
+				t.cancel()
+		p.settleTimer=None
+		p.holdTimer=None
+
+	def timer(self, ms, func, p):
+		t=threading.Timer(ms/1000.0, func, (p,))
+		t.daemon=True
+		t.start()
+		return t
+
+	def emit(self, pin, kind):
+		self.events.put((pin, kind))
+		if(self.notify is not None):
+			self.notify()
+
+class fakeGPIO(object):
+	# Enough of RPi.GPIO to run without GPIO pins. press() and release()
+	# change an input and call its edge callback, as the real library would
+	BOARD=10
+	BCM=11
+	OUT=0
+	IN=1
+	PUD_OFF=20
+	PUD_DOWN=21
+	PUD_UP=22
+	RISING=31
+	FALLING=32
+	BOTH=33
+
+	def __init__(self):
+		self.levels={}
+		self.callbacks={}
+
+	def setmode(self, mode):
+		pass
+
+	def setwarnings(self, flag):
+		pass
+
+	def setup(self, pin, direction, pull_up_down=None, initial=0):
+		if(direction==self.IN):
+			self.levels[pin]=1 if pull_up_down==self.PUD_UP else 0
+		else:
+			self.levels[pin]=initial
+
+	def input(self, pin):
+		return self.levels.get(pin, 0)
+
+	def output(self, pin, value):
+		self.levels[pin]=1 if value else 0
+
+	def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+		self.callbacks[pin]=callback
+
+	def remove_event_detect(self, pin):
+		self.callbacks.pop(pin, None)
+
+	def cleanup(self, pin=None):
+		self.callbacks={}
+
+	def set(self, pin, level):
+		if(self.levels.get(pin)==level):
+			return
+		self.levels[pin]=level
+		callback=self.callbacks.get(pin)
+		if(callback is not None):
+			callback(pin)
+
+	def press(self, pin):
+		self.set(pin, 0)
+
+	def release(self, pin):
+		self.set(pin, 1)
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+# GPIO button test
+#
+# Drives gpioInput through fakeGPIO, so it runs without a Pi. Each case
+# presses and releases a pin at set times, bouncing on some edges as a real
+# switch does, and checks the events which come out: one press however much
+# it bounces, a long press instead of a press when held, and repeats while
+# held for as long as the button is down.
+
+import time
+from gpioInput import gpioInput, fakeGPIO
+
+BOUNCE = 50
+LONG = 400
+REPEAT = 200
+
+gpio = fakeGPIO()
+gpio.setmode(gpio.BOARD)
+notified = [0]
+def notify():
+	notified[0] += 1
+buttons = gpioInput(gpio, notify)
+
+def bounce(pin, level, times=4):
+	# A switch chattering for a few milliseconds before settling on level
+	for i in range(times):
+		gpio.set(pin, 1-level)
+		time.sleep(0.002)
+		gpio.set(pin, level)
+		time.sleep(0.002)
+
+def run(pin, steps):
+	# steps is a list of (milliseconds from the start, action), then waits for
+	# anything still to come and returns the kinds of event sent for the pin
+	start = time.time()
+	for at, action in steps:
+		time.sleep(max(0, start+at/1000.0-time.time()))
+		action()
+	time.sleep((BOUNCE+LONG)/1000.0)
+	return [kind for p, kind in buttons.get() if p==pin]
+
+def press(pin):
+	return lambda: bounce(pin, 0)
+
+def release(pin):
+	return lambda: bounce(pin, 1)
+
+cases = []
+
+buttons.add(11, BOUNCE)
+cases.append(("bouncing press", run(11, [(0, press(11)), (150, release(11))]), ["press"]))
+cases.append(("released while bouncing", run(11, [(0, lambda: gpio.press(11)), (10, lambda: gpio.release(11)),
+	(200, press(11)), (300, release(11))]), ["press", "press"]))
+
+buttons.add(13, BOUNCE, longPress=LONG)
+cases.append(("short press of long pin", run(13, [(0, press(13)), (150, release(13))]), ["press"]))
+cases.append(("held past long press", run(13, [(0, press(13)), (LONG+200, release(13))]), ["long"]))
+
+buttons.add(15, BOUNCE, repeat=REPEAT)
+cases.append(("held with repeat", run(15, [(0, press(15)), (3*REPEAT+100, release(15))]),
+	["press", "repeat", "repeat", "repeat"]))
+cases.append(("tap with repeat", run(15, [(0, press(15)), (REPEAT//2, release(15))]), ["press"]))
+
+buttons.remove(11)
+cases.append(("removed pin", run(11, [(0, press(11)), (150, release(11))]), []))
+
+ok = True
+for name, got, expected in cases:
+	match = got==expected
+	ok = ok and match
+	print("{0:26s} expected {1:32s} got {2:32s} {3}".format(name, ",".join(expected) or "-",
+		",".join(got) or "-", "" if match else "WRONG"))
+print("Main loop woken {0} times".format(notified[0]))
+ok = ok and notified[0]==sum(len(expected) for name, got, expected in cases)
+print("Passed" if ok else "FAILED")
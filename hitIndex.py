@@ -0,0 +1,41 @@
+# hitIndex
+#
+# Finds what has been touched without testing every widget on the screen.
+# The screen is split into square cells and each widget is listed in every
+# cell its rectangle covers, so a touch is only tested against the few
+# widgets in its own cell. The index is built when the layout changes, not
+# on every touch.
+
+import pygame
+
+class hitIndex(object):
+	def __init__(self, width, height, cellSize=32):
+		self.cellSize=cellSize
+		self.cols=-(-width//cellSize)
+		self.rows=-(-height//cellSize)
+		self.clear()
+
+	def clear(self):
+		self.cells=[[] for i in range(self.cols*self.rows)]
+
+	def add(self, rect, item):
+		# List item in every cell rect covers. Items added first are found first
+		rect=pygame.Rect(rect)
+		if(rect.w<=0 or rect.h<=0):
+			return
+		left=max(0, rect.left//self.cellSize)
+		right=min(self.cols-1, (rect.right-1)//self.cellSize)
+		top=max(0, rect.top//self.cellSize)
+		bottom=min(self.rows-1, (rect.bottom-1)//self.cellSize)
+		for r in range(top, bottom+1):
+			for c in range(left, right+1):
+				self.cells[r*self.cols+c].append((rect, item))
+
+	def find(self, pos):
+		# The items whose rect contains pos
+		x, y=pos
+		c=x//self.cellSize
+		r=y//self.cellSize
+		if(x<0 or y<0 or c>=self.cols or r>=self.rows):
+			return []
+		return [item for rect, item in self.cells[r*self.cols+c] if rect.collidepoint(pos)]
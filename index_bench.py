@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+# Time building the file index for 10000 files from an /api/files response,
+# and querying it by sort order and letter group.
+
+import json
+import random
+import timeit
+from fileList import makeEntry, fileIndex
+
+count = 10000
+random.seed(1)
+words = ["benchy", "bracket", "clip", "gear", "hinge", "mount", "spool", "vase", "25mm", "2x"]
+
+# Shaped like OctoPrint's /api/files response
+response = json.dumps({"files": [{
+	"name": "{0}_{1:05d}.gcode".format(random.choice(words), i),
+	"path": "{0}_{1:05d}.gcode".format(random.choice(words), i),
+	"type": "machinecode",
+	"date": 1500000000+random.randint(0, 50000000),
+	"size": random.randint(1000, 50000000),
+	"gcodeAnalysis": {"estimatedPrintTime": random.choice([None, random.randint(60, 100000)])},
+	"prints": {"last": {"date": random.choice([None, 1500000000+random.randint(0, 50000000)])}}
+	} for i in range(count)]})
+
+groups = ("ABCD", "EFGH", "IJKL", "MNOP", "QRST", "UVWXYZ", "#")
+
+def build():
+	return fileIndex([makeEntry(f) for f in json.loads(response)["files"]], groups)
+
+runs = 10
+t = timeit.timeit(build, number=runs)
+print("Build {0} files: {1:8.1f} ms".format(count, t*1000/runs))
+
+index = build()
+runs = 10000
+for mode in fileIndex.modes:
+	for letters in (None, "B", "ABCD"):
+		t = timeit.timeit(lambda: index.select(mode, letters), number=runs)
+		print("{0:5s} {1:5s} {2:6d} files: {3:8.1f} us".format(mode, str(letters), len(index.select(mode, letters)), t*1000000/runs))
@@ -0,0 +1,122 @@
+# listView
+#
+# A scrolling list which only draws the rows that can be seen. Rows are drawn
+# onto a small pool of reusable surfaces, one more than fit on the screen, and
+# a row is only drawn again when a different item scrolls into its surface.
+# Scrolling costs the same however long the list is.
+#
+# The list can be paged, dragged and flung with the touch screen. Taps are
+# returned to the caller as (item index, x position within the row).
+
+import time
+import pygame
+
+class listView(object):
+	def __init__(self, rect, rowHeight, items, drawRow, background):
+		# items needs len() and indexing. drawRow(surface, item) draws one row
+		# onto a surface already filled with the background
+		self.rect=pygame.Rect(rect)
+		self.rowHeight=rowHeight
+		self.items=items
+		self.drawRow=drawRow
+		self.background=background
+		self.visibleRows=self.rect.h//rowHeight
+		self.pool=[[None, pygame.Surface((self.rect.w, rowHeight)).convert()] for i in range(self.visibleRows+1)]
+		self.offset=0.0		# Scroll position in pixels
+		self.velocity=0.0	# Fling speed in pixels per second
+		self.friction=1500.0	# Fling slows by this many pixels per second, per second
+		self.dragY=None
+		self.dragMoved=0
+		self.lastMove=None
+		self.lastTick=None
+		self.rowsDrawn=0	# Count of rows drawn, to check the pool is reused
+
+	def reset(self):
+		# The items have changed, draw every row again
+		for slot in self.pool:
+			slot[0]=None
+		self.scrollTo(self.offset)
+
+	def maxOffset(self):
+		return max(0, len(self.items)*self.rowHeight-self.rect.h)
+
+	def scrollTo(self, offset):
+		self.offset=float(max(0, min(offset, self.maxOffset())))
+
+	def pageUp(self):
+		self.velocity=0.0
+		self.scrollTo(self.offset-self.visibleRows*self.rowHeight)
+
+	def pageDown(self):
+		self.velocity=0.0
+		self.scrollTo(self.offset+self.visibleRows*self.rowHeight)
+
+	def canScroll(self):
+		# Returns whether it can scroll up and down
+		return self.offset>0, self.offset<self.maxOffset()
+
+	def moving(self):
+		return self.velocity!=0.0
+
+	def update(self):
+		# Move on any fling, call every frame while moving()
+		now=time.time()
+		if(self.velocity!=0.0 and self.lastTick is not None):
+			dt=now-self.lastTick
+			before=self.offset
+			self.scrollTo(self.offset+self.velocity*dt)
+			slow=self.friction*dt
+			if(abs(self.velocity)<=slow or self.offset==before):
+				self.velocity=0.0
+			elif(self.velocity>0):
+				self.velocity-=slow
+			else:
+				self.velocity+=slow
+		self.lastTick=now
+
+	def handleEvent(self, event):
+		# Drag and fling on the list. Returns (index, x) when an item is tapped
+		if(event.type==pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos)):
+			self.velocity=0.0
+			self.dragY=event.pos[1]
+			self.dragMoved=0
+			self.lastMove=(time.time(), event.pos[1], 0.0)
+		elif(event.type==pygame.MOUSEMOTION and self.dragY is not None):
+			dy=event.pos[1]-self.dragY
+			self.dragY=event.pos[1]
+			self.dragMoved+=abs(dy)
+			self.scrollTo(self.offset-dy)
+			now=time.time()
+			dt=now-self.lastMove[0]
+			if(dt>0):
+				self.lastMove=(now, event.pos[1], -dy/dt)
+		elif(event.type==pygame.MOUSEBUTTONUP and self.dragY is not None):
+			self.dragY=None
+			if(self.dragMoved<self.rowHeight/2):
+				# Hardly moved, it was a tap
+				index=int((self.offset+event.pos[1]-self.rect.y)//self.rowHeight)
+				if(0<=index<len(self.items)):
+					return index, event.pos[0]-self.rect.x
+			elif(time.time()-self.lastMove[0]<0.1):
+				# Still moving when let go, fling it
+				self.velocity=self.lastMove[2]
+				self.lastTick=time.time()
+		return None
+
+	def draw(self, screen):
+		# Draw the visible rows, returns the area drawn
+		screen.set_clip(self.rect)
+		screen.fill(self.background, self.rect)
+		first=int(self.offset//self.rowHeight)
+		last=min(len(self.items), first+len(self.pool))
+		for index in range(first, last):
+			slot=self.pool[index%len(self.pool)]
+			if(slot[0]!=index):
+				# A new row has scrolled into this surface
+				slot[0]=index
+				slot[1].fill(self.background)
+				self.drawRow(slot[1], self.items[index])
+				self.rowsDrawn+=1
+			screen.blit(slot[1], (self.rect.x, self.rect.y+index*self.rowHeight-int(self.offset)))
+		screen.set_clip(None)
+		return self.rect
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# Time scrolling the file list, a small drag and a page down with a redraw
+# each time, for lists of different lengths. The cost should not grow with
+# the length of the list. Runs without a screen using SDL's dummy driver.
+#
+# Every list scrolls over the same first rows, going back to the top at the
+# end, so each case draws the same number of new rows. The text is rendered
+# into the cache before timing, and misses counted separately, so the times
+# are only the list's own work.
+
+import os
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import timeit
+import pygame
+pygame.init()
+screen = pygame.display.set_mode((320, 240))
+
+from listView import listView
+import textCache
+from textCache import renderText
+
+font = pygame.font.Font('freesansbold.ttf', 14)
+background = (0,0,64)
+rowHeight = 18
+viewHeight = 216
+# Rows scrolled over in every case, fewer than the smallest list
+window = 80
+
+def drawRow(surface, f):
+	surface.blit(renderText(font, f["filename"], 1, (60,200,60)), (0,0))
+
+# Big enough to hold every row scrolled over
+textCache.cache.maxBytes = 16*1024*1024
+
+runs = 1000
+for count in (100, 1000, 10000):
+	files = [{"filename": "file_{0:05d}.gcode".format(i), "date": i} for i in range(count)]
+	view = listView((25, 10, 295, viewHeight), rowHeight, files, drawRow, background)
+	end = window*rowHeight-viewHeight
+
+	def drag():
+		if(view.offset>=end):
+			view.scrollTo(0)
+		else:
+			view.scrollTo(view.offset+5)
+		view.draw(screen)
+
+	def page():
+		if(view.offset>=end):
+			view.scrollTo(0)
+		else:
+			view.scrollTo(min(end, view.offset+viewHeight))
+		view.draw(screen)
+
+	results = []
+	for step in (drag, page):
+		# One pass over the window renders its text, then time from the top
+		view.scrollTo(0)
+		for i in range(window*rowHeight):
+			step()
+		view.scrollTo(0)
+		view.draw(screen)
+		rows = view.rowsDrawn
+		misses = textCache.cache.stats()[1]
+		t = timeit.timeit(step, number=runs)
+		results.append((t*1000000/runs, float(view.rowsDrawn-rows)/runs, textCache.cache.stats()[1]-misses))
+	print("{0:6d} files: {1[0]:7.1f} us per drag ({1[1]:.2f} rows drawn, {1[2]} misses), {2[0]:7.1f} us per page ({2[1]:.2f} rows drawn, {2[2]} misses)".format(count, results[0], results[1]))
@@ -4,8 +4,13 @@
 #
 # Draws simple buttons and reponds yes/no if clicked
 # Buttons are an outline with coloured text
+# Changing the text, highlight or active flag marks the button dirty, so the
+# screen only needs to redraw buttons which have changed
+# Each appearance (normal, highlighted, disabled) is composed once into a
+# surface and reused, until the text or geometry changes
 
 import pygame
+from textCache import renderText
 
 # Initialise fonts
 pygame.font.init()
@@ -14,18 +19,59 @@ Font = pygame.font.Font('freesansbold.ttf', 14)
 class miniScButton(object):
 	def __init__(self, x, y, w, h, text, borderCol, textCol, highCol, a):
 		# Button paramaters: geom = (x, y of top left, w, h)
-		self.text=text
+		self._text=text
+		self.setGeometry(x, y, w, h)
+		self.borderCol=borderCol
+		self.textCol=textCol
+		self.highCol=highCol
+		self.Border = 3
+		self._highlight = 0
+		self._active=a
+		self.dirty=True
+
+	def setGeometry(self, x, y, w, h):
 		self.x=x
 		self.y=y
 		self.w=w
 		self.h=h
 		self.BoundBox=pygame.Rect(x,y,w,h)
-		self.borderCol=borderCol
-		self.textCol=textCol
-		self.highCol=highCol
-		self.Border = 3
-		self.highlight = 0
-		self.active=a
+		# Area covered when drawn, the disabled shading overlaps by a pixel
+		self.area=pygame.Rect(x-1,y-1,w+2,h+2)
+		# Composed appearances, keyed on (highlight, active, background)
+		self.surfaces={}
+		self.dirty=True
+
+	# Properties which change the look of the button mark it for redrawing
+	@property
+	def text(self):
+		return self._text
+
+	@text.setter
+	def text(self, t):
+		if(t!=self._text):
+			self._text=t
+			self.surfaces={}
+			self.dirty=True
+
+	@property
+	def highlight(self):
+		return self._highlight
+
+	@highlight.setter
+	def highlight(self, h):
+		if(h!=self._highlight):
+			self._highlight=h
+			self.dirty=True
+
+	@property
+	def active(self):
+		return self._active
+
+	@active.setter
+	def active(self, a):
+		if(a!=self._active):
+			self._active=a
+			self.dirty=True
 		
 	# Handle mouse events	
 	def handleEvent(self, eventObj):
@@ -46,19 +92,40 @@ class miniScButton(object):
 		return rtn
 		
 		
-	def draw(self, screen):
-		# Draw object on screen
+	def draw(self, screen, background=None):
+		# Draw object on screen, over a background colour if given
+		# Returns the area drawn
+		key=(self.highlight, self.active, background)
+		surface=self.surfaces.get(key)
+		if(surface is None):
+			surface=self.compose(background)
+			self.surfaces[key]=surface
+		screen.blit(surface, self.area)
+		self.dirty=False
+		return self.area
+
+	def compose(self, background):
+		# Build the button as it currently looks on its own surface, the size
+		# of its area. Without a background it is drawn on a transparent one
+		if(background is None):
+			surface=pygame.Surface(self.area.size, pygame.SRCALPHA).convert_alpha()
+			surface.fill((0,0,0,0))
+		else:
+			surface=pygame.Surface(self.area.size).convert()
+			surface.fill(background)
+		# Button rectangle relative to the surface
+		x, y=1, 1
 		if(self.highlight==1):
-			pygame.draw.rect(screen, self.highCol, (self.x,self.y,self.w,self.h))
-		pygame.draw.rect(screen, self.borderCol, (self.x,self.y,self.w,self.h), self.Border)
-		label = Font.render(self.text, 1, self.textCol)
+			pygame.draw.rect(surface, self.highCol, (x,y,self.w,self.h))
+		pygame.draw.rect(surface, self.borderCol, (x,y,self.w,self.h), self.Border)
+		label = renderText(Font, self.text, 1, self.textCol)
 		labelBox = label.get_rect()
-		labelBox.center = int(self.w/2)+self.x, int(self.h/2)+self.y
-		screen.blit(label, labelBox)
+		labelBox.center = int(self.w/2)+x, int(self.h/2)+y
+		surface.blit(label, labelBox)
 
 		if(self.active==0):
 			temp = pygame.Surface((self.w+2, self.h+2)).convert()
 			temp.fill((50,50,50))
 			temp.set_alpha(192)
-			screen.blit(temp,(self.x-1,self.y-1))
-			#pygame.draw.rect(screen, (50,50,50), (self.x,self.y,self.w,self.h), 10)
+			surface.blit(temp,(0,0))
+		return surface
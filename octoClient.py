@@ -0,0 +1,125 @@
+# octoClient
+#
+# A single HTTP client shared by every OctoPrint call. It owns one
+# requests.Session so connections are pooled and kept alive between status
+# polls rather than opening a new TCP connection for every request. Also
+# counts requests made against connections opened to show the reuse.
+#
+# Requests to OctoPrint can go through a circuitBreaker, so while OctoPrint
+# is down they fail straight away with circuitOpen instead of each waiting
+# for the connect timeout.
+#
+# Requests made with retry=False are tried once, for callers with a deadline
+# of their own such as the status poll. They share the same connection pool.
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+try:
+	from urllib3.util.retry import Retry
+except ImportError:
+	from requests.packages.urllib3.util.retry import Retry
+
+class countingAdapter(HTTPAdapter):
+	# Transport adapter which counts the new connections its pools open
+	def __init__(self, client, **kwargs):
+		# Must be set before HTTPAdapter.__init__ builds the pool manager
+		self.client=client
+		HTTPAdapter.__init__(self, **kwargs)
+
+	def init_poolmanager(self, *args, **kwargs):
+		HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+		classes={}
+		for scheme, poolClass in self.poolmanager.pool_classes_by_scheme.items():
+			classes[scheme]=type('counting'+poolClass.__name__, (poolClass,),
+				{'_new_conn': self.countConn(poolClass._new_conn)})
+		self.poolmanager.pool_classes_by_scheme=classes
+
+	def countConn(self, newConn):
+		client=self.client
+		def _new_conn(pool):
+			client.count('connections')
+			return newConn(pool)
+		return _new_conn
+
+class circuitOpen(requests.exceptions.ConnectionError):
+	# Raised instead of calling OctoPrint while the breaker is open
+	pass
+
+class octoClient(object):
+	def __init__(self, headers, connectTimeout=2.0, readTimeout=5.0, retries=2, backoff=0.3, breaker=None):
+		# headers are sent with every OctoPrint request, e.g. the API key
+		# Timeouts are in seconds. Failed connections and idempotent requests
+		# are retried with an exponential backoff, POSTs are never resent
+		self.timeout=(connectTimeout, readTimeout)
+		self.breaker=breaker
+		self.connections=0
+		self.requests=0
+		self.countLock=threading.Lock()
+
+		# Headers to remove for requests to sites other than OctoPrint
+		self.plainHeaders=dict((k, None) for k in headers)
+
+		retry=Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504),
+			raise_on_status=False)
+		adapter=countingAdapter(self, pool_connections=2, pool_maxsize=4, max_retries=retry)
+		self.session=self.makeSession(headers, adapter)
+		# No retries, using the pool above
+		once=HTTPAdapter(max_retries=Retry(0, read=False, raise_on_status=False))
+		once.poolmanager=adapter.poolmanager
+		self.onceSession=self.makeSession(headers, once)
+
+	def makeSession(self, headers, adapter):
+		session=requests.Session()
+		session.headers.update(headers)
+		session.mount('http://', adapter)
+		session.mount('https://', adapter)
+		return session
+
+	def count(self, name):
+		with self.countLock:
+			setattr(self, name, getattr(self, name)+1)
+
+	def request(self, method, url, plain=False, retry=True, **kwargs):
+		# plain requests do not send the OctoPrint headers and do not go
+		# through the breaker. A timeout of None uses the client's timeouts
+		if(kwargs.get('timeout') is None):
+			kwargs['timeout']=self.timeout
+		if(plain):
+			kwargs['headers']=self.plainHeaders
+		session=self.session if retry else self.onceSession
+		if(plain or self.breaker is None):
+			self.count('requests')
+			return session.request(method, url, **kwargs)
+
+		if(not self.breaker.allow()):
+			wait=self.breaker.retryIn()
+			if(wait is None):
+				raise circuitOpen(None, "OctoPrint unreachable, already checking if it is back")
+			raise circuitOpen(None, "OctoPrint unreachable, trying again in {0:.0f}s".format(wait))
+		self.count('requests')
+		ok=False
+		try:
+			r=session.request(method, url, **kwargs)
+			ok=True
+			return r
+		finally:
+			# Anything but a response, mostly connection errors and timeouts
+			self.breaker.record(ok)
+
+	def get(self, url, **kwargs):
+		return self.request('GET', url, **kwargs)
+
+	def post(self, url, **kwargs):
+		return self.request('POST', url, **kwargs)
+
+	def delete(self, url, **kwargs):
+		return self.request('DELETE', url, **kwargs)
+
+	def stats(self):
+		# Returns requests made and connections opened
+		return self.requests, self.connections
+
+	def close(self):
+		self.onceSession.close()
+		self.session.close()
@@ -0,0 +1,255 @@
+# octoConfig
+#
+# Reads octominiscreen.cfg into immutable config objects: the settings, the
+# soft (on screen) buttons and the GPIO buttons. Every value is converted to
+# its type and checked when the file is read, so a mistake is reported with
+# its section and option at startup rather than when a button is pressed.
+# Button commands are split into their type and arguments here, once.
+#
+# The file is only parsed again when it has changed. Loading an unchanged
+# file, judged by its modification time and size, or failing that by a hash
+# of its contents, returns the config already read. A configWatcher checks
+# the file in the background, so edits can be used without a restart.
+
+import hashlib
+import io
+import os
+import threading
+from collections import namedtuple
+from buttonModel import types, visibilities, TOGGLE
+try:
+	from ConfigParser import RawConfigParser, Error as ParserError
+except ImportError:
+	from configparser import RawConfigParser, Error as ParserError
+
+class configError(Exception):
+	pass
+
+# A button command, split into its type and arguments. GCODE arguments are a
+# tuple of the individual commands with surrounding space and blanks removed
+command = namedtuple('command', ['text', 'kind', 'arg'])
+
+def parseCommand(cmd):
+	sp=cmd.split(':',1)
+	if(len(sp)<2):
+		return command(cmd, sp[0], "")
+	if(sp[0]=="GCODE"):
+		return command(cmd, sp[0], tuple(c.strip() for c in sp[1].split(';') if c.strip()))
+	return command(cmd, sp[0], sp[1])
+
+# The [settings] section, as (field, option, type, default). A default of
+# REQUIRED means the option must be given
+REQUIRED=object()
+settingsSpec=(
+	('OctoURL', 'octourl', str, REQUIRED),
+	('APIkey', 'apikey', str, REQUIRED),
+	('Width', 'width', int, REQUIRED),
+	('Height', 'height', int, REQUIRED),
+	('Pointer', 'show_pointer', bool, REQUIRED),
+	('BPR', 'buttons_per_row', int, REQUIRED),
+	('screenSave', 'screen_save', int, REQUIRED),		# Seconds
+	('screenFile', 'screen_save_cont', str, REQUIRED),
+	('screenSavePoll', 'screen_save_poll', int, 5),
+	('screenSaveSpeed', 'screen_save_speed', int, 10),
+	('screenSaveFPS', 'screen_save_fps', int, 2),
+	('screenBlank', 'screen_blank', int, 0),
+	('statRefresh', 'status_refresh', int, REQUIRED),	# Milliseconds
+	('statIdle', 'status_idle', int, 10000),
+	('statBackoff', 'status_backoff', int, 60000),
+	('breakerFailures', 'breaker_failures', int, 3),
+	('connectTimeout', 'connect_timeout', float, 2.0),
+	('requestTimeout', 'request_timeout', float, 2.0),
+	('pollDeadline', 'poll_deadline', float, 5.0),
+	('Push', 'push', bool, False),
+	('pushThrottle', 'push_throttle', int, 1),
+	('textCacheKB', 'text_cache_kb', int, None),
+	('retries', 'retries', int, 2),
+	('retryBackoff', 'retry_backoff', float, 0.3),
+	('Piezo', 'piezo', bool, REQUIRED),
+	('Piezo_pin', 'piezo_pin', int, None),
+	('Piezo_duration', 'piezo_duration', float, None),
+	('click_delay', 'click_delay', int, REQUIRED),	# Milliseconds
+	('commandTimeout', 'command_timeout', float, 10.0),	# Seconds
+	('commandWorkers', 'command_workers', int, 2),
+	('commandQueue', 'command_queue', int, 8),
+	('maxFPS', 'max_fps', int, 20),
+	('idleCpuTarget', 'idle_cpu_target', float, 2.0),
+	('cpuReport', 'cpu_report', int, 60),
+	('configCheck', 'config_check', int, 2),		# Seconds, 0=never
+	)
+settings = namedtuple('settings', [s[0] for s in settingsSpec])
+
+# Settings which are only used when the screen starts, a changed config
+# file keeps the old values of these until restarted
+restartSettings=('OctoURL', 'APIkey', 'Width', 'Height', 'Pointer', 'screenFile',
+	'screenSavePoll', 'connectTimeout', 'requestTimeout', 'Push', 'pushThrottle',
+	'retries', 'retryBackoff', 'Piezo', 'Piezo_pin', 'Piezo_duration', 'configCheck',
+	'commandWorkers', 'commandQueue')
+
+# An on screen button. A static button has one label and command, a toggle
+# cycles through them. type and visible are buttonModel constants, read from
+# static or toggle and a(always), p(not when printing) or o(not when no
+# octoprint). Further presses within debounce milliseconds are ignored, and
+# the command is given timeout seconds
+softButton = namedtuple('softButton', ['section', 'type', 'labels', 'commands', 'visible',
+	'debounce', 'timeout'])
+
+# A GPIO button. Times are in milliseconds, apart from the command timeout in
+# seconds. longCommand is None if a long press does nothing
+gpioButton = namedtuple('gpioButton', ['section', 'type', 'label', 'pin', 'commands',
+	'bounce', 'longPress', 'longCommand', 'repeat', 'timeout'])
+
+screenConfig = namedtuple('screenConfig', ['settings', 'buttons', 'gpioButtons'])
+
+# Configs already read, by file name, with the modification time, size and
+# hash they were read from
+loaded = {}
+
+def loadConfig(filename):
+	# Returns the screenConfig for a file, raises configError if it is wrong
+	try:
+		st=os.stat(filename)
+		stat=(st.st_mtime, st.st_size)
+		cached=loaded.get(filename)
+		if(cached is not None and cached[0]==stat):
+			return cached[2]
+		f=open(filename, "rb")
+		data=f.read()
+		f.close()
+	except (OSError, IOError) as e:
+		raise configError("Can not read " + filename + ": " + str(e))
+	digest=hashlib.sha1(data).hexdigest()
+	if(cached is not None and cached[1]==digest):
+		# Touched but not changed
+		loaded[filename]=(stat, digest, cached[2])
+		return cached[2]
+
+	config=parseConfig(data.decode('utf-8'))
+	loaded[filename]=(stat, digest, config)
+	return config
+
+def parseConfig(text):
+	cfg = RawConfigParser()
+	try:
+		try:
+			cfg.read_file(io.StringIO(text))
+		except AttributeError:
+			cfg.readfp(io.StringIO(text))
+	except ParserError as e:
+		raise configError(str(e))
+	if(not cfg.has_section('settings')):
+		raise configError("No [settings] section")
+
+	values=[]
+	for field, option, kind, default in settingsSpec:
+		values.append(getValue(cfg, 'settings', option, kind, default))
+	s=settings(*values)
+	if(s.commandWorkers<1 or s.commandQueue<1):
+		raise configError("[settings] command_workers and command_queue must be at least 1")
+	if(s.Piezo and (s.Piezo_pin is None or s.Piezo_duration is None)):
+		raise configError("[settings] piezo needs piezo_pin and piezo_duration")
+	if(s.BPR<1 or s.maxFPS<1 or s.screenSaveFPS<1):
+		raise configError("[settings] buttons_per_row, max_fps and screen_save_fps must be at least 1")
+
+	buttons=[]
+	gpioButtons=[]
+	for section in cfg.sections():
+		if(section.find('button')>-1):
+			buttons.append(parseButton(cfg, section, s))
+		if(section.find('gpio')>-1):
+			gpioButtons.append(parseGPIO(cfg, section, s))
+	pins=[b.pin for b in gpioButtons]
+	for p in pins:
+		if(pins.count(p)>1):
+			raise configError("GPIO pin " + str(p) + " is used by more than one button")
+	return screenConfig(s, tuple(buttons), tuple(gpioButtons))
+
+def getValue(cfg, section, option, kind=str, default=REQUIRED):
+	# An option converted to its type
+	if(not cfg.has_option(section, option)):
+		if(default is REQUIRED):
+			raise configError("[" + section + "] " + option + " is missing")
+		return default
+	try:
+		if(kind is bool):
+			return cfg.getboolean(section, option)
+		if(kind is str):
+			return cfg.get(section, option)
+		return kind(cfg.get(section, option))
+	except ValueError:
+		raise configError("[" + section + "] " + option + " should be " + {bool: "yes or no", int: "a whole number", float: "a number"}[kind] + ", not " + cfg.get(section, option))
+
+def getCommands(cfg, section, bType):
+	# The command, or for a toggle the list of commands split by |
+	cmdIn=getValue(cfg, section, 'command').replace('\n','')
+	if(bType==TOGGLE):
+		return tuple(parseCommand(c) for c in cmdIn.split('|'))
+	return (parseCommand(cmdIn),)
+
+def getType(cfg, section):
+	bType=getValue(cfg, section, 'type')
+	if(bType not in types):
+		raise configError("[" + section + "] type should be static or toggle, not " + bType)
+	return types[bType]
+
+def parseButton(cfg, section, s):
+	bType=getType(cfg, section)
+	label=getValue(cfg, section, 'label')
+	labels=tuple(label.split('|')) if bType==TOGGLE else (label,)
+	commands=getCommands(cfg, section, bType)
+	if(len(labels)!=len(commands)):
+		raise configError("[" + section + "] has " + str(len(labels)) + " labels but " + str(len(commands)) + " commands")
+	visible=getValue(cfg, section, 'visible', str, 'a')
+	if(visible not in visibilities):
+		raise configError("[" + section + "] visible should be a, p or o, not " + visible)
+	return softButton(section, bType, labels, commands, visibilities[visible],
+		getValue(cfg, section, 'debounce', int, s.click_delay),
+		getValue(cfg, section, 'timeout', float, s.commandTimeout))
+
+def parseGPIO(cfg, section, s):
+	bType=getType(cfg, section)
+	pin=getValue(cfg, section, 'pin', int)
+	commands=getCommands(cfg, section, bType)
+	longCommand=None
+	if(cfg.has_option(section, 'long_command')):
+		longCommand=parseCommand(getValue(cfg, section, 'long_command').replace('\n',''))
+	longPress=getValue(cfg, section, 'long_press', int, 0)
+	if(longCommand is None):
+		longPress=0
+	elif(longPress==0):
+		longPress=1000
+	return gpioButton(section, bType, "GPIO_PIN"+str(pin), pin, commands,
+		getValue(cfg, section, 'bounce', int, 50), longPress, longCommand,
+		getValue(cfg, section, 'repeat', int, 0),
+		getValue(cfg, section, 'timeout', float, s.commandTimeout))
+
+class configWatcher(object):
+	# Checks the config file every interval seconds on a background thread.
+	# notify is called when it has changed, or become broken, and latest is
+	# then (config, None) for a good file or (last good config, error)
+	def __init__(self, filename, config, interval=2, notify=None):
+		self.filename=filename
+		self.interval=interval
+		self.notify=notify
+		self.latest=(config, None)
+		self.stopEvent=threading.Event()
+		self.thread=threading.Thread(target=self.run, name="configWatcher")
+		self.thread.daemon=True
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopEvent.set()
+
+	def run(self):
+		while not self.stopEvent.wait(self.interval):
+			config, error=self.latest
+			try:
+				latest=(loadConfig(self.filename), None)
+			except configError as e:
+				latest=(config, str(e))
+			if(latest[0] is not config or latest[1]!=error):
+				self.latest=latest
+				if(self.notify is not None):
+					self.notify()
@@ -0,0 +1,102 @@
+# octoPush
+#
+# Optional push status from OctoPrint's socket at /sockjs/websocket, which
+# sends the printer state, job and progress about twice a second. While the
+# socket is up the status poller is suspended. When it drops the poller takes
+# over again and we keep trying to reconnect.
+#
+# Needs the websocket-client module. Messages are handed to onMessage as
+# decoded JSON, pushStatus turns them into status snapshots. push_test.py
+# replays recorded messages from a stand-in server to check them.
+
+import json
+import threading
+try:
+	import websocket
+except ImportError:
+	websocket = None
+from printerState import fromMessage
+
+# Events after which the file list needs downloading again
+fileEvents=("UpdatedFiles", "FileAdded", "FileRemoved")
+
+class pushStatus(object):
+	# What the screen does with each message, given to octoPush as onMessage.
+	# Status messages become snapshots published through update, the status
+	# poller's, file events call filesChanged
+	def __init__(self, update, filesChanged, width):
+		self.update=update
+		self.filesChanged=filesChanged
+		self.width=width
+
+	def __call__(self, msg):
+		if("event" in msg):
+			if(msg["event"].get("type") in fileEvents):
+				self.filesChanged()
+			return
+		self.update(lambda prev: fromMessage(prev, msg, self.width))
+
+class octoPush(object):
+	def __init__(self, url, onMessage, login=None, retryDelay=10, throttle=1):
+		# url         ws:// address of the push socket
+		# onMessage   Called with each decoded message while connected
+		# login       Called on connect, returns the 'user:session' auth string
+		#             or None to stay anonymous
+		# retryDelay  Seconds to wait before reconnecting
+		# throttle    Multiplier of OctoPrint's 0.5s update rate
+		self.url=url
+		self.onMessage=onMessage
+		self.login=login
+		self.retryDelay=retryDelay
+		self.throttle=throttle
+		self.live=False
+		self.ws=None
+		self.stopEvent=threading.Event()
+		self.thread=threading.Thread(target=self.run, name="octoPush")
+		self.thread.daemon=True
+
+	@staticmethod
+	def available():
+		return websocket is not None
+
+	def isLive(self):
+		return self.live
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopEvent.set()
+		ws=self.ws
+		if(ws is not None):
+			ws.close()
+
+	def run(self):
+		while not self.stopEvent.is_set():
+			try:
+				self.listen()
+			except Exception as e:
+				if(not self.stopEvent.is_set()):
+					print("Push socket closed: " + str(e))
+			self.live=False
+			self.stopEvent.wait(self.retryDelay)
+
+	def listen(self):
+		self.ws=websocket.create_connection(self.url, timeout=self.retryDelay*3)
+		try:
+			if(self.login is not None):
+				auth=self.login()
+				if(auth is not None):
+					self.ws.send(json.dumps({"auth": auth}))
+			if(self.throttle!=1):
+				self.ws.send(json.dumps({"throttle": self.throttle}))
+			print("Push socket connected to " + self.url)
+			while not self.stopEvent.is_set():
+				msg=self.ws.recv()
+				if(not msg):
+					break
+				self.live=True
+				self.onMessage(json.loads(msg))
+		finally:
+			self.ws.close()
+			self.ws=None
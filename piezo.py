@@ -0,0 +1,56 @@
+# piezo
+#
+# Beeps from the piezo buzzer, played on a background thread so the screen
+# never waits for them. Beeps asked for while one is playing are coalesced,
+# only one waits to be played next, the most important.
+#
+# Patterns are a list of (on, off) times in seconds. 'ack' uses the chirp
+# duration from the config.
+
+import threading
+import time
+
+class piezo(object):
+	def __init__(self, gpio, pin, duration=0.01):
+		# gpio is the RPi.GPIO module, or anything with output(pin, value)
+		self.gpio=gpio
+		self.pin=pin
+		self.patterns={'ack': ((duration, 0),),
+			'error': ((0.05, 0.08), (0.05, 0)),
+			'finished': ((0.6, 0),)}
+		# Which pattern wins when they are coalesced
+		self.priority={'ack': 0, 'error': 1, 'finished': 2}
+		self.pending=None
+		self.wake=threading.Condition()
+		self.thread=threading.Thread(target=self.run, name="piezo")
+		self.thread.daemon=True
+		self.thread.start()
+
+	def play(self, name='ack'):
+		# Returns straight away, the beep is played in the background
+		with self.wake:
+			if(self.pending is None or self.priority.get(name, 0)>=self.priority.get(self.pending, 0)):
+				self.pending=name
+			self.wake.notify()
+
+	def run(self):
+		while True:
+			with self.wake:
+				while(self.pending is None):
+					self.wake.wait()
+				name=self.pending
+				self.pending=None
+			for on, off in self.patterns.get(name, ()):
+				self.gpio.output(self.pin, True)
+				time.sleep(on)
+				self.gpio.output(self.pin, False)
+				time.sleep(off)
+
+class stubBuzzer(object):
+	# Stands in for GPIO to check beep timing without a buzzer. Records
+	# (time, pin, value) for every output
+	def __init__(self):
+		self.outputs=[]
+
+	def output(self, pin, value):
+		self.outputs.append((time.time(), pin, bool(value)))
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# Status poll test
+#
+# Feeds recorded /api/version, /api/printer and /api/job responses through
+# pollStatus and printerState, as the status poller does, and checks the
+# state each poll gives, the changes of state the listeners are told about
+# and the connect button for each. OctoPrint going away is fed through
+# failed, as the poller does when it can not connect.
+
+from printerState import printerState, octoStatus, pollStatus, failed, connectMode, names
+from printerState import STARTING, READY, ERROR, OFFLINE, NO_PRINTER, PRINTING, PAUSED, LOADED
+from printerState import CONNECT, PAUSE, RESUME, PRINT, FILEMAN, NO_ACTION
+
+WIDTH = 14
+
+version = (200, {"api": "0.1", "server": "1.9.3", "text": "OctoPrint 1.9.3"})
+
+def printer(text, printing=False, paused=False, tool=21.3, bed=20.8, toolTarget=0.0, bedTarget=0.0):
+	flags = {"operational": True, "printing": printing, "paused": paused, "pausing": False,
+		"cancelling": False, "error": False, "ready": not printing and not paused,
+		"closedOrError": False, "sdReady": False}
+	return (200, {"sd": {"ready": False},
+		"state": {"text": text, "flags": flags},
+		"temperature": {"tool0": {"actual": tool, "target": toolTarget, "offset": 0},
+			"bed": {"actual": bed, "target": bedTarget, "offset": 0}}})
+
+def job(f, completion=None, printTime=None, left=None, state="Operational"):
+	return (200, {"job": {"file": {"name": f, "path": f, "origin": "local", "size": 1234567 if f else None},
+			"estimatedPrintTime": 3600 if f else None, "filament": None},
+		"progress": {"completion": completion, "filepos": None, "printTime": printTime, "printTimeLeft": left},
+		"state": state})
+
+notConnected = (409, {"error": "Printer is not operational"})
+
+# Each poll as the responses OctoPrint gave, None when it could not be
+# reached, with the state it should give
+recorded = [
+	("operational, nothing loaded", {"version": version, "printer": printer("Operational"), "job": job(None)}, READY),
+	("file selected", {"version": version, "printer": printer("Operational"), "job": job("benchy.gcode")}, LOADED),
+	("printing", {"version": version, "printer": printer("Printing", printing=True, tool=205.2, bed=59.9, toolTarget=210, bedTarget=60),
+		"job": job("benchy.gcode", 12.4, 446, 3150, "Printing")}, PRINTING),
+	("no change", {"version": version, "printer": printer("Printing", printing=True, tool=205.2, bed=59.9, toolTarget=210, bedTarget=60),
+		"job": job("benchy.gcode", 12.4, 446, 3150, "Printing")}, PRINTING),
+	("further on", {"version": version, "printer": printer("Printing", printing=True, tool=209.7, bed=60.1, toolTarget=210, bedTarget=60),
+		"job": job("benchy.gcode", 57.9, 2080, 1510, "Printing")}, PRINTING),
+	("paused", {"version": version, "printer": printer("Paused", paused=True, tool=209.9, bed=60.0, toolTarget=210, bedTarget=60),
+		"job": job("benchy.gcode", 58.0, 2085, 1505, "Paused")}, PAUSED),
+	("resumed", {"version": version, "printer": printer("Printing", printing=True, tool=210.0, bed=60.0, toolTarget=210, bedTarget=60),
+		"job": job("benchy.gcode", 58.2, 2090, 1500, "Printing")}, PRINTING),
+	("finished", {"version": version, "printer": printer("Operational", tool=180.4, bed=58.2),
+		"job": job("benchy.gcode", 100.0, 3602, 0)}, LOADED),
+	("printer disconnected", {"version": version, "printer": notConnected}, NO_PRINTER),
+	("OctoPrint stopped", None, OFFLINE),
+	("OctoPrint starting", {"version": (503, None)}, ERROR),
+	("printer connected again", {"version": version, "printer": printer("Operational"), "job": job(None)}, READY),
+	]
+
+buttons = {READY: FILEMAN, LOADED: PRINT, PRINTING: PAUSE, PAUSED: RESUME,
+	NO_PRINTER: CONNECT, OFFLINE: NO_ACTION, ERROR: NO_ACTION}
+
+# What OctoPrint sent last time, so fetch can say whether it has changed as
+# the response cache does
+last = {}
+fetched = []
+def fetcher(responses):
+	def fetch(name):
+		fetched.append(name)
+		code, data = responses[name]
+		changed = last.get(name)!=(code, data)
+		last[name] = (code, data)
+		return code, data, changed
+	return fetch
+
+transitions = []
+state = printerState(octoStatus(STARTING, "0", "0", None))
+state.listen(transitions.append)
+
+ok = True
+for label, responses, expected in recorded:
+	del fetched[:]
+	if(responses is None):
+		last.clear()
+		status = failed(state.status, OFFLINE)
+	else:
+		status = pollStatus(state.status, fetcher(responses), WIDTH)
+	changed = state.apply(status)
+	match = state.state==expected and connectMode(state.state)==buttons[expected]
+	ok = ok and match
+	print("{0:26s} expected {1:10s} got {2:10s} {3:5s} {4:28s} {5}".format(label, names[expected],
+		names[state.state], "new" if changed else "same", ",".join(fetched), "" if match else "WRONG"))
+
+# Each change of state once, with the end of the print seen as finished
+expectedChanges = [(STARTING, READY), (READY, LOADED), (LOADED, PRINTING), (PRINTING, PAUSED),
+	(PAUSED, PRINTING), (PRINTING, LOADED), (LOADED, NO_PRINTER), (NO_PRINTER, OFFLINE),
+	(OFFLINE, ERROR), (ERROR, READY)]
+print("Changes of state: " + ", ".join(names[t.old] + ">" + names[t.new] for t in transitions))
+finished = [t for t in transitions if t.printFinished()]
+ok = ok and [tuple(t) for t in transitions]==expectedChanges and len(finished)==1
+
+# Starting up during a pause, the file and progress should be shown from the
+# first poll, without fetching the job again while it stays paused
+print("Starting while paused")
+paused = {"version": version, "printer": printer("Paused", paused=True, tool=209.9, bed=60.0, toolTarget=210, bedTarget=60),
+	"job": job("benchy.gcode", 58.0, 2085, 1505, "Paused")}
+last.clear()
+state = printerState(octoStatus(STARTING, "0", "0", None))
+for i in range(2):
+	del fetched[:]
+	state.apply(pollStatus(state.status, fetcher(paused), WIDTH))
+	d = state.status.details
+	print("  {0} {1} {2}% fetched {3}".format(names[state.state], state.status.progress, d.completion, ",".join(fetched)))
+	ok = ok and state.state==PAUSED and d.file=="benchy.gcode" and d.completion==58.0 and d.left==1505
+	ok = ok and state.status.progress=="benchy.gcode - 58%" and ("job" in fetched)==(i==0)
+
+print("Passed" if ok else "FAILED")
@@ -0,0 +1,231 @@
+# printerState
+#
+# What the printer is doing, worked out from the OctoPrint responses. Each
+# status poll or push message is turned into an octoStatus snapshot by
+# pollStatus or fromPush, which only read the parsed JSON, so they can be run
+# against recorded responses, as poll_test.py and push_test.py do. Along with
+# the state, the snapshot carries the print details for the dashboard, such
+# as temperatures and times.
+#
+# printerState holds the current snapshot and tells its listeners about each
+# change of state, which is when the buttons shown, the connect button and
+# the status bar need changing. Nothing is done while the state stays the
+# same.
+
+from collections import namedtuple
+
+# Printer states
+STARTING=-1		# No status yet
+READY=0			# OctoPrint and printer up, no file loaded
+ERROR=1			# OctoPrint up but giving errors
+OFFLINE=2		# OctoPrint not running
+NO_PRINTER=3		# OctoPrint up, printer not connected
+PRINTING=4
+PAUSED=5
+PAUSING=6
+LOADED=7		# A file is loaded ready to print
+names={STARTING: "starting", READY: "ready", ERROR: "error", OFFLINE: "offline",
+	NO_PRINTER: "no printer", PRINTING: "printing", PAUSED: "paused",
+	PAUSING: "pausing", LOADED: "loaded"}
+
+# States with OctoPrint not answering properly, and with a print under way
+DOWN=(ERROR, OFFLINE)
+ACTIVE=(PRINTING, PAUSED, PAUSING)
+# States with a printer connected
+CONNECTED=(READY, PRINTING, PAUSED, PAUSING, LOADED)
+
+# What the connect button does in each state
+NO_ACTION=0
+CONNECT=1
+PAUSE=2
+RESUME=3
+PRINT=4
+FILEMAN=5
+connectModes={STARTING: CONNECT, NO_PRINTER: CONNECT, PRINTING: PAUSE,
+	PAUSED: RESUME, LOADED: PRINT, READY: FILEMAN}
+connectLabels={CONNECT: "Connect", PAUSE: "Pause", RESUME: "Resume",
+	PRINT: "Print", FILEMAN: "Fileman"}
+
+def connectMode(state):
+	return connectModes.get(state, NO_ACTION)
+
+# Status snapshot
+#  state       One of the printer states above
+#  progress    Status bar progress text
+#  progMini    Short progress text for the screen saver
+#  details     printDetails, None without a printer
+octoStatus=namedtuple('octoStatus', 'state progress progMini details')
+
+# Print details for the dashboard, None where not known. Temperatures are
+# rounded to whole degrees and times are in seconds, so small changes do
+# not make a new snapshot. OctoPrint only gives Z through the push socket
+printDetails=namedtuple('printDetails', 'file hotend hotendTarget bed bedTarget completion elapsed left z')
+noDetails=printDetails(None, None, None, None, None, None, None, None, None)
+
+class transition(namedtuple('transition', 'old new')):
+	__slots__=()
+
+	def printFinished(self):
+		return self.old==PRINTING and self.new in (READY, LOADED)
+
+def progressText(f, p, width):
+	# Status bar and screen saver text for file f, p percent printed. Names
+	# longer than width are cut short
+	if(len(f)>width):
+		progress=f[:width]+"... "+str(p)+"%"
+	else:
+		progress=f+" - "+str(p)+"%"
+	return progress, str(p)+"%"
+
+def fileText(f, width):
+	# Status bar text for a file loaded and ready to print
+	if(len(f)>width):
+		return f[:width+6]+"..."
+	else:
+		return f
+
+def completion(progress):
+	# Percent printed from a progress object, which is null before it starts
+	if(progress["completion"]):
+		return int(progress["completion"])
+	return 0
+
+def reading(temp):
+	# (actual, target) in whole degrees from a tool or bed temperature
+	if(not temp):
+		return None, None
+	actual, target=temp.get("actual"), temp.get("target")
+	return (None if actual is None else int(round(actual)),
+		None if target is None else int(round(target)))
+
+def details(prev, temps, job, progress, z=None):
+	# New printDetails from the parts of a response, None parts keep what
+	# prev had. temps is the tool and bed temperatures, job and progress the
+	# job and progress parts of /api/job or a push message
+	d=prev or noDetails
+	changes={}
+	if(temps):
+		changes['hotend'], changes['hotendTarget']=reading(temps.get("tool0"))
+		changes['bed'], changes['bedTarget']=reading(temps.get("bed"))
+	if(job is not None):
+		changes['file']=job["file"]["name"]
+	if(progress is not None):
+		c=progress["completion"]
+		changes['completion']=None if c is None else round(c, 1)
+		changes['elapsed']=progress.get("printTime")
+		changes['left']=progress.get("printTimeLeft")
+	if(z is not None):
+		changes['z']=z
+	return d._replace(**changes)
+
+def snapshot(prev, flags, job, progress, d, width):
+	# Snapshot from the printer state flags and the job and progress parts,
+	# which are None if they could not be read
+	if(flags.get("pausing") or flags.get("paused")):
+		state=PAUSING if flags.get("pausing") else PAUSED
+		if(job is None):
+			# Not fetched while paused, the progress shown stands
+			return prev._replace(state=state, details=d)
+		progText, progMini=progressText(job["file"]["name"] or "", completion(progress), width)
+		return octoStatus(state, progText, progMini, d)
+	elif(flags.get("printing")):
+		if(job is None):
+			return octoStatus(PRINTING, "print job unknown!", "??%", d)
+		progText, progMini=progressText(job["file"]["name"] or "", completion(progress), width)
+		return octoStatus(PRINTING, progText, progMini, d)
+	elif(flags.get("operational")):
+		if(job is None):
+			return prev._replace(state=READY, progress="FileInfo error", details=d)
+		f=job["file"]["name"]
+		if(f is None):
+			# Nothing to print
+			return prev._replace(state=READY, details=d)
+		return prev._replace(state=LOADED, progress=fileText(f, width), details=d)
+	# No printer found
+	return prev._replace(state=NO_PRINTER, details=None)
+
+def needsJob(prev, printer):
+	# Does the /api/job response need fetching to go with this /api/printer
+	# response? While paused nothing in it changes, so only until the file
+	# is known, as it is not after starting up during a pause
+	flags=printer["state"]["flags"]
+	if(flags.get("paused") or flags.get("pausing")):
+		return prev.details is None or prev.details.file is None
+	return flags.get("printing") or flags.get("operational")
+
+def fromPoll(prev, printer, job, width):
+	# Snapshot from the /api/printer response and the /api/job response,
+	# which is None if it was not or could not be read
+	jobPart=job["job"] if job is not None else None
+	progress=job["progress"] if job is not None else None
+	d=details(prev.details, printer.get("temperature"), jobPart, progress)
+	return snapshot(prev, printer["state"]["flags"], jobPart, progress, d, width)
+
+def pollStatus(prev, fetch, width):
+	# One status poll. fetch(name) reads the 'version', 'printer' or 'job'
+	# response from OctoPrint and returns (status code, parsed JSON, changed).
+	# Failing to reach OctoPrint at all is left to the caller, see failed
+	code, version, changed=fetch('version')
+	if(code!=200):
+		# Some sort of error, don't care what
+		return prev._replace(state=ERROR)
+	# We are up and running, what about the printer? Its state and
+	# temperatures come together, a 409 means it is not connected
+	code, printer, printerChanged=fetch('printer')
+	if(code!=200):
+		return prev._replace(state=NO_PRINTER)
+	job=None
+	if(needsJob(prev, printer)):
+		# What is loaded or printing
+		jobCode, job, jobChanged=fetch('job')
+		if(not printerChanged and not jobChanged and prev.state in (READY, PRINTING, LOADED)):
+			# Nothing new, the status worked out last time stands
+			return prev
+		if(jobCode!=200):
+			job=None
+	return fromPoll(prev, printer, job, width)
+
+def failed(prev, state):
+	# Snapshot when OctoPrint could not be reached, OFFLINE, or did not answer
+	# in time, ERROR. What was known about the print is kept
+	return prev._replace(state=state)
+
+def fromPush(prev, current, width):
+	# Snapshot from the current or history part of a push message
+	temps=current.get("temps")
+	d=details(prev.details, temps[-1] if temps else None, current["job"],
+		current["progress"], current.get("currentZ"))
+	return snapshot(prev, current["state"]["flags"], current["job"], current["progress"], d, width)
+
+def fromMessage(prev, msg, width):
+	# Snapshot from any push message, prev unless it is a current or history
+	# message, the only ones which carry the status
+	current=msg.get("current", msg.get("history"))
+	if(current is None):
+		return prev
+	return fromPush(prev, current, width)
+
+class printerState(object):
+	def __init__(self, status):
+		self.status=status
+		self.listeners=[]
+
+	def listen(self, func):
+		# func(transition) is called on each change of state
+		self.listeners.append(func)
+
+	@property
+	def state(self):
+		return self.status.state
+
+	def apply(self, status):
+		# Take a new snapshot. Returns True if anything shown has changed
+		if(status is None or status==self.status):
+			return False
+		old=self.status
+		self.status=status
+		if(status.state!=old.state):
+			t=transition(old.state, status.state)
+			for func in self.listeners:
+				func(t)
+		return True
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+# Push socket test
+#
+# Runs a stand-in OctoPrint push socket on localhost which replays recorded
+# messages, then listens to it through octoPush and pushStatus as the screen
+# does, publishing through a status poller which is never started. Checks
+# the login and throttle are sent, that each message leaves the expected
+# printer state and that file events refresh the file list. The socket is closed after each replay, so it also
+# shows octoPush falling back and connecting again.
+#
+# Needs the websocket-client module, as push status does.
+
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from octoPush import octoPush, pushStatus
+from statusPoller import statusPoller
+from printerState import octoStatus, names, STARTING, READY, LOADED, PRINTING, PAUSED
+
+PORT = 5098
+URL = "ws://127.0.0.1:{0}/sockjs/websocket".format(PORT)
+
+def flags(printing=False, paused=False):
+	return {"operational": True, "printing": printing, "paused": paused, "pausing": False,
+		"cancelling": False, "error": False, "ready": not printing}
+
+def status(f, completion, printTime, left, printing=False, paused=False, temps=(), z=None):
+	text = "Paused" if paused else ("Printing" if printing else "Operational")
+	return {"state": {"text": text, "flags": flags(printing, paused)},
+		"job": {"file": {"name": f, "path": f, "origin": "local"}, "estimatedPrintTime": 3600},
+		"progress": {"completion": completion, "printTime": printTime, "printTimeLeft": left},
+		"currentZ": z, "temps": list(temps), "logs": [], "messages": []}
+
+def temps(tool, bed):
+	return {"time": 0, "tool0": {"actual": tool, "target": 210.0}, "bed": {"actual": bed, "target": 60.0}}
+
+# Messages as OctoPrint sends them, with the state each should leave
+recorded = [
+	({"connected": {"version": "1.9.3", "apikey": None, "plugin_hash": "x", "config_hash": "y"}}, STARTING),
+	({"history": status(None, None, None, None)}, READY),
+	({"event": {"type": "FileAdded", "payload": {"name": "benchy.gcode"}}}, READY),
+	({"event": {"type": "UpdatedFiles", "payload": {"type": "printables"}}}, READY),
+	({"current": status("benchy.gcode", None, None, None)}, LOADED),
+	({"current": status("benchy.gcode", 0.5, 12, 3580, printing=True, temps=[temps(205.4, 59.8)], z=0.2)}, PRINTING),
+	({"current": status("benchy.gcode", 42.1, 1500, 2100, printing=True, temps=[temps(210.2, 60.1)], z=8.4)}, PRINTING),
+	({"plugin": {"plugin": "softwareupdate", "data": {}}}, PRINTING),
+	({"current": status("benchy.gcode", 42.3, 1510, 2090, paused=True, temps=[temps(209.8, 60.0)])}, PAUSED),
+	({"current": status("benchy.gcode", 100.0, 3620, 0)}, LOADED),
+	({"event": {"type": "FileRemoved", "payload": {"name": "old.gcode"}}}, LOADED),
+	]
+
+def frame(text):
+	# An unmasked text frame, as a server sends
+	data = text.encode("utf-8")
+	if(len(data)<126):
+		header = struct.pack("!BB", 0x81, len(data))
+	elif(len(data)<65536):
+		header = struct.pack("!BBH", 0x81, 126, len(data))
+	else:
+		header = struct.pack("!BBQ", 0x81, 127, len(data))
+	return header + data
+
+def readExact(conn, n):
+	data = b""
+	while len(data)<n:
+		chunk = conn.recv(n-len(data))
+		if(not chunk):
+			raise IOError("Client closed the socket")
+		data += chunk
+	return data
+
+def readFrame(conn):
+	# A masked frame from the client. Returns (opcode, payload)
+	b0, b1 = struct.unpack("!BB", readExact(conn, 2))
+	length = b1 & 0x7f
+	if(length==126):
+		length = struct.unpack("!H", readExact(conn, 2))[0]
+	elif(length==127):
+		length = struct.unpack("!Q", readExact(conn, 8))[0]
+	mask = bytearray(readExact(conn, 4)) if b1 & 0x80 else bytearray(4)
+	payload = bytearray(readExact(conn, length))
+	for i in range(length):
+		payload[i] ^= mask[i%4]
+	return b0 & 0x0f, bytes(payload)
+
+class standIn(object):
+	# Accepts connections one at a time and replays the recorded messages to
+	# each, keeping what the client sent
+	def __init__(self):
+		self.received = []
+		self.connections = 0
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.sock.bind(("127.0.0.1", PORT))
+		self.sock.listen(1)
+		self.thread = threading.Thread(target=self.serve)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def serve(self):
+		while True:
+			conn, addr = self.sock.accept()
+			try:
+				self.replay(conn)
+			except IOError as e:
+				print("Stand-in: " + str(e))
+			conn.close()
+
+	def replay(self, conn):
+		request = b""
+		while b"\r\n\r\n" not in request:
+			request += readExact(conn, 1)
+		key = None
+		for line in request.decode("latin-1").split("\r\n"):
+			if(line.lower().startswith("sec-websocket-key:")):
+				key = line.split(":", 1)[1].strip()
+		accept = base64.b64encode(hashlib.sha1((key+"258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode("ascii")).digest())
+		conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+			b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+		self.connections += 1
+
+		# The client sends its auth and throttle before anything else
+		conn.settimeout(0.5)
+		try:
+			while True:
+				opcode, payload = readFrame(conn)
+				if(opcode==1):
+					self.received.append(json.loads(payload.decode("utf-8")))
+		except socket.timeout:
+			pass
+		conn.settimeout(None)
+
+		for msg, expected in recorded:
+			conn.sendall(frame(json.dumps(msg)))
+			time.sleep(0.05)
+		# Close, the client should fall back and connect again
+		conn.sendall(struct.pack("!BB", 0x88, 0))
+
+# The screen's handler, publishing through a poller as the screen does
+poller = statusPoller(None, 1000, initial=octoStatus(STARTING, "0", "0", None), suspend=lambda: True)
+invalidated = [0]
+def filesChanged():
+	invalidated[0] += 1
+handler = pushStatus(poller.update, filesChanged, 14)
+
+states = []
+liveSeen = [False]
+def onMessage(msg):
+	liveSeen[0] = liveSeen[0] or push.isLive()
+	handler(msg)
+	states.append(poller.status.state)
+
+server = standIn()
+push = octoPush(URL, onMessage, lambda: "_api:sessionkey", retryDelay=1, throttle=2)
+push.start()
+time.sleep(4)
+push.stop()
+print("Push live while messages came in: " + str(liveSeen[0]))
+
+print("Connections: {0}".format(server.connections))
+print("Sent by the client: " + json.dumps(server.received[:2]))
+ok = server.received[:2]==[{"auth": "_api:sessionkey"}, {"throttle": 2}]
+for (msg, expected), got in zip(recorded, states):
+	name = list(msg.keys())[0]
+	match = got==expected
+	ok = ok and match
+	print("{0:10s} expected {1:10s} got {2:10s} {3}".format(name, names.get(expected, "-"),
+		names.get(got, "-"), "" if match else "WRONG"))
+print("File list refreshes: {0}".format(invalidated[0]))
+print("Last status: " + str(poller.status))
+ok = ok and invalidated[0]>=3 and liveSeen[0] and server.connections>=2 and len(states)>=len(recorded)
+print("Passed" if ok else "FAILED")
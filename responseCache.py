@@ -0,0 +1,71 @@
+# responseCache
+#
+# The parsed JSON of the OctoPrint responses the status poll reads, so an
+# unchanged response is not parsed again. Responses are fetched with the
+# ETag from the last one, when OctoPrint gave one, and a 304 reply is served
+# from the cache. Otherwise the body is hashed and only parsed if the hash
+# differs. Responses which can not change while OctoPrint is up, such as
+# /api/version, are fetched once and kept until forget() is called, which
+# should be done whenever OctoPrint can not be reached.
+#
+# Counts how many responses were served from the cache and the bytes which
+# did not need downloading or parsing.
+
+import hashlib
+import threading
+
+class responseCache(object):
+	def __init__(self, client):
+		self.client=client
+		self.entries={}		# url: (etag, digest, size, data)
+		self.lock=threading.Lock()
+		self.responses=0	# Responses asked for
+		self.unchanged=0	# Of which were the same as last time
+		self.bytesSkipped=0	# Not downloaded, a 304 or kept response
+		self.bytesUnparsed=0	# Downloaded but the same, so not parsed
+
+	def get(self, url, timeout=None, keep=False):
+		# Returns (status code, parsed JSON or None, changed since last time)
+		# keep returns the cached response without asking OctoPrint
+		with self.lock:
+			entry=self.entries.get(url)
+			self.responses+=1
+			if(keep and entry is not None):
+				self.unchanged+=1
+				self.bytesSkipped+=entry[2]
+				return 200, entry[3], False
+
+		headers={}
+		if(entry is not None and entry[0] is not None):
+			headers['If-None-Match']=entry[0]
+		# Not retried, the poll's deadline is made up of the timeouts
+		r=self.client.get(url, headers=headers, timeout=timeout, retry=False)
+		if(r.status_code==304 and entry is not None):
+			with self.lock:
+				self.unchanged+=1
+				self.bytesSkipped+=entry[2]
+			return 200, entry[3], False
+		if(r.status_code!=200):
+			return r.status_code, None, True
+
+		body=r.content
+		digest=hashlib.sha1(body).digest()
+		if(entry is not None and entry[1]==digest):
+			with self.lock:
+				self.unchanged+=1
+				self.bytesUnparsed+=len(body)
+			return 200, entry[3], False
+		data=r.json()
+		with self.lock:
+			self.entries[url]=(r.headers.get('ETag'), digest, len(body), data)
+		return 200, data, True
+
+	def forget(self):
+		# OctoPrint may have gone away, fetch everything again next time
+		with self.lock:
+			self.entries={}
+
+	def stats(self):
+		# Returns responses, unchanged, bytes not downloaded, bytes not parsed
+		with self.lock:
+			return self.responses, self.unchanged, self.bytesSkipped, self.bytesUnparsed
@@ -0,0 +1,214 @@
+# saverContent
+#
+# Text shown on the screen saver, read in the background rather than every
+# frame. Each line comes from a source:
+#  FILE:path           The contents of a file, e.g. written by a sensor script
+#  API:url#field       A field from an OctoPrint API response, dotted for
+#                      nested fields, e.g. API:/api/printer#temperature.bed.actual
+#  CMD:command         The output of a shell command
+# A source without a prefix is a file.
+#
+# Files are watched with inotify where available, so they are only read when
+# they change. Otherwise they, and the API and command sources, are checked
+# every interval seconds while the screen saver is showing. The latest text
+# of each source is kept for the screen to read, and notify is called when
+# any of it changes.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import subprocess
+import threading
+import time
+import requests
+
+# inotify events which mean a file has been written or replaced
+IN_CLOSE_WRITE=0x008
+IN_MOVED_TO=0x080
+IN_CREATE=0x100
+IN_DELETE=0x200
+
+def inotifyInit():
+	# Returns (libc, file descriptor) for inotify, or None if not available
+	try:
+		libc=ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		fd=libc.inotify_init1(os.O_NONBLOCK)
+	except (OSError, AttributeError):
+		return None
+	if(fd<0):
+		return None
+	return libc, fd
+
+class contentSource(object):
+	def __init__(self, interval):
+		self.text=""
+		self.interval=interval
+		self.due=0		# When it next needs checking
+		self.watched=False	# Changes are signalled by inotify
+
+	def update(self):
+		# Read the source, returns True if the text changed
+		new=self.read()
+		if(new==self.text):
+			return False
+		self.text=new
+		return True
+
+class fileSource(contentSource):
+	def __init__(self, path, interval):
+		contentSource.__init__(self, interval)
+		self.path=path
+		self.stat=None
+
+	def read(self):
+		# Only open the file if it has been modified
+		try:
+			st=os.stat(self.path)
+		except OSError:
+			self.stat=None
+			return ""
+		stat=(st.st_mtime, st.st_size)
+		if(stat==self.stat):
+			return self.text
+		self.stat=stat
+		try:
+			f=open(self.path, "r")
+			# File exists, should be one line
+			fstr=f.read().strip()
+			f.close()
+			return fstr
+		except IOError:
+			return ""
+
+class apiSource(contentSource):
+	def __init__(self, client, url, field, interval):
+		contentSource.__init__(self, interval)
+		self.client=client
+		self.url=url
+		self.field=field
+
+	def read(self):
+		try:
+			r=self.client.get(self.url)
+			if(r.status_code!=200):
+				return ""
+			value=r.json()
+			for key in self.field.split('.'):
+				value=value[key]
+			return str(value)
+		except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+			return ""
+
+class commandSource(contentSource):
+	def __init__(self, command, interval):
+		contentSource.__init__(self, interval)
+		self.command=command
+
+	def read(self):
+		try:
+			return subprocess.check_output(self.command, shell=True).decode('utf-8', 'replace').strip()
+		except (subprocess.CalledProcessError, OSError):
+			return ""
+
+class saverContent(object):
+	def __init__(self, spec, client, baseURL, interval=5, notify=None):
+		# spec is the sources split by |, see above. interval is in seconds
+		self.notify=notify
+		self.sources=[]
+		for s in spec.split('|'):
+			s=s.strip()
+			if(not s):
+				continue
+			sp=s.split(':', 1)
+			if(len(sp)==2 and sp[0]=="API"):
+				url, field=sp[1].split('#', 1)
+				self.sources.append(apiSource(client, baseURL+url, field, interval))
+			elif(len(sp)==2 and sp[0]=="CMD"):
+				self.sources.append(commandSource(sp[1], interval))
+			elif(len(sp)==2 and sp[0]=="FILE"):
+				self.sources.append(fileSource(sp[1], interval))
+			else:
+				self.sources.append(fileSource(s, interval))
+
+		self.active=False
+		self.stopped=False
+		self.wakeRead, self.wakeWrite=os.pipe()
+		self.inotify=inotifyInit()
+		if(self.inotify is not None):
+			self.watchFiles()
+		self.thread=threading.Thread(target=self.run, name="saverContent")
+		self.thread.daemon=True
+
+	def watchFiles(self):
+		# Watch the folder of each file, so files which are replaced or do
+		# not exist yet are still seen
+		libc, fd=self.inotify
+		mask=IN_CLOSE_WRITE|IN_MOVED_TO|IN_CREATE|IN_DELETE
+		for s in self.sources:
+			if(isinstance(s, fileSource)):
+				folder=os.path.dirname(os.path.abspath(s.path))
+				if(libc.inotify_add_watch(fd, folder.encode('utf-8'), mask)>=0):
+					s.watched=True
+
+	def lines(self):
+		# The text of every source, safe to call from any thread
+		return [s.text for s in self.sources]
+
+	def setActive(self, active):
+		# Polled sources are only checked while the screen saver is showing
+		if(active!=self.active):
+			self.active=active
+			self.wake()
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopped=True
+		self.wake()
+
+	def wake(self):
+		os.write(self.wakeWrite, b'x')
+
+	def run(self):
+		# Read every source once, then as they change or fall due
+		changed=False
+		for s in self.sources:
+			changed=s.update() or changed
+		if(changed and self.notify is not None):
+			self.notify()
+
+		while not self.stopped:
+			now=time.time()
+			polled=[s for s in self.sources if not s.watched]
+			if(self.active and polled):
+				timeout=max(0, min(s.due for s in polled)-now)
+			else:
+				timeout=None
+			waitOn=[self.wakeRead]
+			if(self.inotify is not None):
+				waitOn.append(self.inotify[1])
+			ready=select.select(waitOn, [], [], timeout)[0]
+
+			changed=False
+			if(self.wakeRead in ready):
+				os.read(self.wakeRead, 64)
+			if(self.inotify is not None and self.inotify[1] in ready):
+				# Something changed in a watched folder, check our files
+				try:
+					while(os.read(self.inotify[1], 4096)):
+						pass
+				except OSError:
+					pass
+				for s in self.sources:
+					if(s.watched):
+						changed=s.update() or changed
+			if(self.active):
+				now=time.time()
+				for s in polled:
+					if(s.due<=now):
+						changed=s.update() or changed
+						s.due=now+s.interval
+			if(changed and self.notify is not None):
+				self.notify()
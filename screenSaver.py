@@ -0,0 +1,119 @@
+# screenSaver
+#
+# Moves the screen saver text slowly around the screen. The position comes
+# from the time since the saver started, so the speed does not depend on how
+# busy the Pi is, and it is only updated a few times a second. Each update
+# only repaints the area the text left and the area it moved to.
+#
+# After a longer time the saver goes into a deep idle, where nothing is drawn
+# at all and the display is blanked through sysfs if it allows it.
+#
+# Times are pygame ticks, milliseconds the main loop also uses, which do not
+# jump when the wall clock is set.
+
+import glob
+import pygame
+
+class screenSaver(object):
+	def __init__(self, width, height, speed=10, fps=2, deepAfter=0, fbdev="/dev/fb1"):
+		# speed is in pixels per second, fps the updates per second. After
+		# deepAfter seconds go into deep idle, 0 for never
+		self.left=10
+		self.top=10
+		self.right=int(width*0.75)
+		self.bottom=int(height*0.75)
+		self.speed=speed
+		self.tick=1000//fps
+		self.deepAfter=deepAfter*1000
+		self.blankFiles=glob.glob("/sys/class/graphics/"+fbdev.split('/')[-1]+"/blank")
+		self.backlightFiles=glob.glob("/sys/class/backlight/*/bl_power")
+		self.started=None
+		self.nextTick=None
+		self.lastRect=None
+		self.deep=False
+
+	def start(self):
+		self.started=pygame.time.get_ticks()
+		self.nextTick=self.started
+		self.lastRect=None
+		self.deep=False
+
+	def stop(self):
+		# Screen saver dismissed, bring the display back
+		if(self.deep):
+			self.blank(False)
+		self.deep=False
+		self.started=None
+
+	def nextWake(self):
+		# Milliseconds until the saver next needs drawing, None if never
+		if(self.started is None or self.deep):
+			return None
+		wake=self.nextTick
+		if(self.deepAfter>0):
+			wake=min(wake, self.started+self.deepAfter)
+		return max(0, wake-pygame.time.get_ticks())
+
+	def isDue(self):
+		wake=self.nextWake()
+		return wake is not None and wake<=0
+
+	def position(self, now):
+		# Where the text is, going down, right, up then left around a rectangle
+		w=self.right-self.left
+		h=self.bottom-self.top
+		d=(now-self.started)*self.speed//1000%(2*(w+h))
+		if(d<h):
+			return self.left, self.top+d
+		d-=h
+		if(d<w):
+			return self.left+d, self.bottom
+		d-=w
+		if(d<h):
+			return self.right, self.bottom-d
+		d-=h
+		return self.right-d, self.top
+
+	def draw(self, screen, lines):
+		# Draw the rendered lines at the current position, one under another
+		# Returns the areas changed
+		if(self.deep):
+			return []
+		now=pygame.time.get_ticks()
+		if(self.deepAfter>0 and now-self.started>=self.deepAfter):
+			# Deep idle, blank everything and stop drawing
+			self.deep=True
+			screen.fill((0,0,0))
+			self.blank(True)
+			return [screen.get_rect()]
+
+		self.nextTick=now+self.tick
+		rects=[]
+		if(self.lastRect is not None):
+			screen.fill((0,0,0), self.lastRect)
+			rects.append(self.lastRect)
+		x, y=self.position(now)
+		newRect=None
+		for line in lines:
+			r=screen.blit(line, (x, y))
+			newRect=r if newRect is None else newRect.union(r)
+			y+=line.get_height()
+		if(newRect is not None):
+			rects.append(newRect)
+		self.lastRect=newRect
+		return rects
+
+	def blank(self, on):
+		# Blank the framebuffer and turn off the backlight where sysfs allows
+		for name in self.blankFiles:
+			self.writeSysfs(name, "1" if on else "0")
+		for name in self.backlightFiles:
+			self.writeSysfs(name, "4" if on else "0")
+
+	def writeSysfs(self, name, value):
+		try:
+			f=open(name, "w")
+			f.write(value)
+			f.close()
+		except IOError:
+			pass
@@ -0,0 +1,98 @@
+# statusPoller
+#
+# Polls the OctoPrint status on a background thread so a slow or missing
+# server never holds up the touch screen. Each poll produces a new immutable
+# octoStatus snapshot. The UI thread reads the latest one without locking,
+# swapping the attribute is atomic. Other status sources, such as the push
+# socket, can publish snapshots too and suspend polling while they are live.
+#
+# Polls quickly while printing, when the status changes most, more slowly
+# while idle and backs off further each time OctoPrint can not be reached.
+# poke() polls straight away, e.g. after a command which changes the state.
+# While the client's breaker is open there is no point polling, holdOff()
+# gives how long until it will call OctoPrint again.
+
+import threading
+import time
+from printerState import DOWN, ACTIVE
+
+class statusPoller(object):
+	def __init__(self, pollFunc, interval, notify=None, initial=None, suspend=None,
+			idleInterval=None, maxBackoff=None, holdOff=None):
+		# pollFunc is called with the previous snapshot and returns the new one
+		# notify is called when the status changes. No polling is done while
+		# suspend() returns True. Intervals are in milliseconds: interval while
+		# printing, idleInterval while idle and up to maxBackoff while
+		# OctoPrint is down. Both default to interval. holdOff() returns the
+		# seconds until OctoPrint will be called again, or None if it will be
+		self.pollFunc=pollFunc
+		self.holdOff=holdOff
+		self.setIntervals(interval, idleInterval, maxBackoff)
+		self.failures=0
+		self.notify=notify
+		self.status=initial
+		self.suspend=suspend
+		self.publishLock=threading.Lock()
+		self.stopped=False
+		self.wakeEvent=threading.Event()
+		self.thread=threading.Thread(target=self.run, name="statusPoller")
+		self.thread.daemon=True
+
+	def setIntervals(self, interval, idleInterval=None, maxBackoff=None):
+		self.interval=interval/1000.0
+		self.idleInterval=(idleInterval or interval)/1000.0
+		self.maxBackoff=(maxBackoff or interval)/1000.0
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopped=True
+		self.wakeEvent.set()
+
+	def poke(self):
+		# Poll now rather than waiting for the interval
+		self.wakeEvent.set()
+
+	def nextInterval(self, status):
+		# Seconds until the next poll
+		if(status is not None and status.state in DOWN):
+			# OctoPrint down or in error, back off
+			wait=self.holdOff() if self.holdOff is not None else None
+			if(wait is not None):
+				# Poll when the breaker lets a probe through
+				self.failures=0
+				return wait
+			self.failures=min(self.failures+1, 16)
+			return min(self.maxBackoff, self.interval*(2**self.failures))
+		self.failures=0
+		if(status is None or status.state in ACTIVE):
+			# Printing, paused or pausing
+			return self.interval
+		return self.idleInterval
+
+	def update(self, func):
+		# Publish func(current snapshot). Only wakes the UI if it changed
+		with self.publishLock:
+			new=func(self.status)
+			if(new==self.status):
+				return
+			self.status=new
+		if(self.notify is not None):
+			self.notify()
+
+	def run(self):
+		while not self.stopped:
+			started=time.time()
+			if(self.suspend is None or not self.suspend()):
+				try:
+					# Poll outside the lock, it can take a few seconds
+					new=self.pollFunc(self.status)
+					self.update(lambda prev: new)
+				except Exception as e:
+					# Never let the poller die, keep the last good status
+					print("Status poll failed: " + str(e))
+
+			# Keep to the refresh interval, however long the poll took
+			self.wakeEvent.wait(max(0, self.nextInterval(self.status)-(time.time()-started)))
+			self.wakeEvent.clear()
@@ -0,0 +1,49 @@
+# textCache
+#
+# Rendering text is one of the slowest things we do on a Pi, and the same
+# labels are drawn over and over. Rendered surfaces are kept in a shared
+# least recently used cache, keyed on font, text, antialias and colour, and
+# limited to a maximum amount of memory.
+
+from collections import OrderedDict
+
+class textCache(object):
+	def __init__(self, maxBytes=512*1024):
+		self.maxBytes=maxBytes
+		self.bytes=0
+		self.hits=0
+		self.misses=0
+		self.surfaces=OrderedDict()
+
+	def render(self, font, text, antialias, colour):
+		# Same arguments as font.render, with the font first
+		key=(font, text, antialias, tuple(colour))
+		surface=self.surfaces.pop(key, None)
+		if(surface is None):
+			self.misses+=1
+			surface=font.render(text, antialias, colour)
+			self.bytes+=self.size(surface)
+		else:
+			self.hits+=1
+		# Most recently used goes to the end
+		self.surfaces[key]=surface
+		self.trim()
+		return surface
+
+	def size(self, surface):
+		return surface.get_width()*surface.get_height()*surface.get_bytesize()
+
+	def trim(self):
+		# Drop the least recently used surfaces until we are under the limit,
+		# always keeping the one just rendered
+		while(self.bytes>self.maxBytes and len(self.surfaces)>1):
+			key, surface=self.surfaces.popitem(last=False)
+			self.bytes-=self.size(surface)
+
+	def stats(self):
+		# Returns hits, misses, number of surfaces and bytes used
+		return self.hits, self.misses, len(self.surfaces), self.bytes
+
+# Shared by everything which draws text
+cache=textCache()
+renderText=cache.render